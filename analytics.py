@@ -0,0 +1,205 @@
+"""
+Population-level nutrition and progress analytics
+
+Reads NutritionLog (joined to FoodItem) and ProgressLog in fixed-size chunks
+with `pd.read_sql` and folds each chunk into per-user running state, so
+memory grows with the number of users rather than the number of log rows.
+From that state it derives per-user and per-fitness_goal cohort figures:
+average daily calories, weekly weight-change rate (least-squares slope),
+logging streaks and the gap between estimated goal calories and what was
+eaten. Results are written back as summary tables and optionally Parquet.
+"""
+
+import os
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+CHUNK_SIZE = 200_000
+
+USER_SUMMARY_TABLE = 'analytics_user_summary'
+COHORT_SUMMARY_TABLE = 'analytics_cohort_summary'
+
+# One row per user and logged day, in (user_id, date) order so streaks can
+# be followed across chunk boundaries. SQLite walks ix_nutrition_log_user_date
+# for the GROUP BY, so no temporary sort is needed.
+DAILY_CALORIES_SQL = text("""
+    SELECT n.user_id, n.date, SUM(f.calories_per_100g * n.quantity_grams / 100.0) AS calories
+    FROM nutrition_log AS n
+    JOIN food_item AS f ON f.id = n.food_id
+    GROUP BY n.user_id, n.date
+    ORDER BY n.user_id, n.date
+""")
+
+PROGRESS_SQL = text("SELECT user_id, date, weight FROM progress_log")
+
+USERS_SQL = text("""
+    SELECT id AS user_id, fitness_goal, gender, age, height, current_weight FROM user
+""")
+
+# Maintenance estimate: Mifflin-St Jeor BMR times a light-activity factor,
+# then a per-goal adjustment in kcal/day
+ACTIVITY_FACTOR = 1.4
+GOAL_CALORIE_OFFSETS = {
+    'weight_loss': -500,
+    'fat_loss': -500,
+    'muscle_gain': 300,
+}
+
+EPOCH = date(2000, 1, 1)
+
+
+def day_numbers(dates):
+    """Whole days since EPOCH for a Series of ISO date strings or dates"""
+    parsed = pd.to_datetime(dates)
+    return ((parsed - pd.Timestamp(EPOCH)) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+
+
+class StreakTracker:
+    """Longest and latest runs of consecutive logged days per user.
+
+    Chunks must arrive in (user_id, day) order; the run still open at the end
+    of one chunk is carried into the next.
+    """
+
+    def __init__(self):
+        self.longest = pd.Series(dtype=np.int64)
+        self.latest = pd.Series(dtype=np.int64)
+        self._carry = None  # (user_id, day, length) of the open run
+
+    def update(self, users, days):
+        if not len(users):
+            return
+        prev_users = np.empty_like(users)
+        prev_days = np.empty_like(days)
+        prev_users[1:], prev_days[1:] = users[:-1], days[:-1]
+        if self._carry is None:
+            prev_users[0], prev_days[0] = -1, 0
+        else:
+            prev_users[0], prev_days[0] = self._carry[0], self._carry[1]
+
+        starts = (users != prev_users) | (days - prev_days != 1)
+        run_ids = np.cumsum(starts)
+        run_ids -= run_ids[0]
+        lengths = np.bincount(run_ids).astype(np.int64)
+        if not starts[0]:
+            lengths[0] += self._carry[2]
+
+        # Each run belongs to the user of its last row; later runs win for `latest`
+        run_ends = np.flatnonzero(np.r_[run_ids[1:] != run_ids[:-1], True])
+        runs = pd.Series(lengths, index=users[run_ends])
+        self.longest = pd.concat([self.longest, runs]).groupby(level=0).max()
+        self.latest = pd.concat([self.latest, runs]).groupby(level=0).last()
+        self._carry = (users[-1], days[-1], lengths[-1])
+
+
+def read_chunks(sql, connection, chunk_size):
+    """DataFrames of at most `chunk_size` rows; one frame for everything if None"""
+    if chunk_size is None:
+        return [pd.read_sql(sql, connection)]
+    return pd.read_sql(sql, connection, chunksize=chunk_size)
+
+
+def nutrition_aggregates(connection, chunk_size=CHUNK_SIZE):
+    """Per-user days logged, total calories and streaks from NutritionLog"""
+    totals = pd.DataFrame(columns=['calories', 'days_logged'], dtype=float)
+    streaks = StreakTracker()
+    for chunk in read_chunks(DAILY_CALORIES_SQL, connection, chunk_size):
+        users = chunk['user_id'].to_numpy(dtype=np.int64)
+        streaks.update(users, day_numbers(chunk['date']))
+        per_user = chunk.groupby('user_id')['calories'].agg(['sum', 'count'])
+        per_user.columns = ['calories', 'days_logged']
+        totals = totals.add(per_user, fill_value=0)
+
+    result = totals.assign(
+        avg_daily_calories=totals['calories'] / totals['days_logged'],
+        longest_streak_days=streaks.longest,
+        latest_streak_days=streaks.latest,
+    )
+    return result.drop(columns='calories')
+
+
+def progress_aggregates(connection, chunk_size=CHUNK_SIZE):
+    """Per-user weekly weight-change rate from ProgressLog.
+
+    The least-squares slope of weight over time only needs the running sums
+    n, Σx, Σy, Σxy and Σx², so rows can arrive in any order and any chunking.
+    """
+    sums = pd.DataFrame(columns=['n', 'x', 'y', 'xy', 'xx'], dtype=float)
+    for chunk in read_chunks(PROGRESS_SQL, connection, chunk_size):
+        x = day_numbers(chunk['date']).astype(float)
+        y = chunk['weight'].to_numpy(dtype=float)
+        terms = pd.DataFrame({'n': 1.0, 'x': x, 'y': y, 'xy': x * y, 'xx': x * x},
+                             index=chunk['user_id'].to_numpy())
+        sums = sums.add(terms.groupby(level=0).sum(), fill_value=0)
+
+    denominator = sums['n'] * sums['xx'] - sums['x'] ** 2
+    slope = (sums['n'] * sums['xy'] - sums['x'] * sums['y']) / denominator.where(denominator > 0)
+    return pd.DataFrame({
+        'weigh_ins': sums['n'],
+        'weekly_weight_change': slope * 7,
+    })
+
+
+def target_calories(users):
+    """Estimated daily calorie target per user from body stats and goal"""
+    sex_offset = np.select([users['gender'] == 'male', users['gender'] == 'female'], [5.0, -161.0], -78.0)
+    bmr = 10 * users['current_weight'] + 6.25 * users['height'] - 5 * users['age'] + sex_offset
+    offset = users['fitness_goal'].map(GOAL_CALORIE_OFFSETS).fillna(0)
+    return bmr * ACTIVITY_FACTOR + offset
+
+
+def user_summary(connection, chunk_size=CHUNK_SIZE):
+    """One row per user with nutrition, progress and goal-gap figures"""
+    users = pd.read_sql(USERS_SQL, connection, index_col='user_id')
+    summary = users[['fitness_goal']].join(nutrition_aggregates(connection, chunk_size))
+    summary = summary.join(progress_aggregates(connection, chunk_size))
+    summary['target_calories'] = target_calories(users)
+    # Positive when the user eats less than their goal calls for
+    summary['calorie_deficit'] = summary['target_calories'] - summary['avg_daily_calories']
+    summary[['days_logged', 'longest_streak_days', 'latest_streak_days', 'weigh_ins']] = (
+        summary[['days_logged', 'longest_streak_days', 'latest_streak_days', 'weigh_ins']].fillna(0).astype(np.int64)
+    )
+    summary.index.name = 'user_id'
+    return summary
+
+
+def cohort_summary(users):
+    """Aggregate a user summary by fitness_goal"""
+    grouped = users.groupby('fitness_goal')
+    cohorts = pd.DataFrame({
+        'users': grouped.size(),
+        'active_users': grouped['days_logged'].agg(lambda days: int((days > 0).sum())),
+        'avg_daily_calories': grouped['avg_daily_calories'].mean(),
+        'avg_target_calories': grouped['target_calories'].mean(),
+        'avg_calorie_deficit': grouped['calorie_deficit'].mean(),
+        'median_weekly_weight_change': grouped['weekly_weight_change'].median(),
+        'avg_longest_streak_days': grouped['longest_streak_days'].mean(),
+        'avg_latest_streak_days': grouped['latest_streak_days'].mean(),
+    })
+    return cohorts.round(3)
+
+
+def build_summaries(engine, chunk_size=CHUNK_SIZE, parquet_dir=None):
+    """Recompute both summary tables; also write Parquet files if asked.
+
+    Returns (user summary, cohort summary) DataFrames.
+    """
+    with engine.connect() as connection:
+        users = user_summary(connection, chunk_size)
+    cohorts = cohort_summary(users)
+    generated_at = datetime.utcnow()
+
+    with engine.begin() as connection:
+        users.assign(generated_at=generated_at).to_sql(
+            USER_SUMMARY_TABLE, connection, if_exists='replace', chunksize=10_000)
+        cohorts.assign(generated_at=generated_at).to_sql(
+            COHORT_SUMMARY_TABLE, connection, if_exists='replace')
+
+    if parquet_dir:
+        os.makedirs(parquet_dir, exist_ok=True)
+        # Needs pyarrow or fastparquet; pandas raises an ImportError naming them otherwise
+        users.to_parquet(os.path.join(parquet_dir, f'{USER_SUMMARY_TABLE}.parquet'))
+        cohorts.to_parquet(os.path.join(parquet_dir, f'{COHORT_SUMMARY_TABLE}.parquet'))
+    return users, cohorts
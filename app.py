@@ -1,17 +1,80 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import (Flask, render_template, request, redirect, url_for, session, jsonify, flash, g,
+                   Response, stream_with_context, abort)
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
+from sqlalchemy import func, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime, date
-import pickle
+import hmac
+import json
 import os
-import pandas as pd
+import numpy as np
+from prediction import (scenarios_to_matrix, predict_many, calibrate, format_predictions,
+                        parse_inputs, predict_trajectory, PredictionCache, cache_key,
+                        FEATURES, MIN_PREDICTED_WEIGHT, MAX_PREDICTED_WEIGHT)
+import calibration
+from storage import load_storage_config, install_sqlite_pragmas
+from instrumentation import Metrics, init_instrumentation
+from batching import MicroBatcher
+from concurrent.futures import TimeoutError as FutureTimeout
+from export import FORMATS, stream_query
+from assets import init_assets
+from auth import PROFILE_FIELDS, UserProfile, UserCache, PasswordHasher, HasherBusy
+from fragments import FragmentCache
+from workouts import (TemplateCatalogue, create_catalogue_versioning, validate_plan, encode_plan,
+                      decode_plan, is_encoded_plan)
+from food_search import create_search_index, search_foods, import_foods_csv
+from model_runtime import (MODEL_PICKLE, MODEL_ARTIFACT, load_linear_model, load_pickled_model,
+                           file_sha256, ModelRegistry, LinearModel, save_version, promote, list_versions)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fittrack.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///fittrack.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+app.config['PREDICTION_CACHE_TTL'] = int(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+app.config['PROGRESS_PAGE_SIZE'] = 50
+app.config['PROGRESS_CHART_MAX_POINTS'] = 500
+app.config['NUTRITION_BATCH_MAX_ENTRIES'] = 5000
+# Profile one in every N requests with cProfile (0 disables)
+app.config['PROFILE_SAMPLE_RATE'] = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+# Bearer token scrapers must send to read /metrics; the endpoint is off (404) without one
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Gather concurrent single predictions into one model call: '1', '0', or 'auto' to
+# batch every model except the JSON-artifact LinearModel, whose single call is
+# cheaper than the queue hand-off
+app.config['PREDICTION_MICROBATCH'] = {'1': True, '0': False}.get(
+    os.environ.get('PREDICTION_MICROBATCH', 'auto'), 'auto'
+)
+app.config['PREDICTION_BATCH_WINDOW_MS'] = float(os.environ.get('PREDICTION_BATCH_WINDOW_MS', 2))
+app.config['PREDICTION_MAX_BATCH'] = int(os.environ.get('PREDICTION_MAX_BATCH', 64))
+app.config['PREDICTION_TIMEOUT'] = 5
+# Seconds between checks of models/CURRENT for a newly promoted model
+app.config['MODEL_RELOAD_INTERVAL'] = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+# Seconds a rendered page fragment (e.g. the workout template list) is reused
+app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+# Seconds between checks of the workout template catalogue version
+app.config['WORKOUT_CATALOGUE_CHECK_INTERVAL'] = float(os.environ.get('WORKOUT_CATALOGUE_CHECK_INTERVAL', 5))
+# Seconds a logged-in user's profile is reused across requests
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+# werkzeug hash method for new passwords, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000';
+# older hashes are redone on the user's next login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# Threads hashing passwords per process, and how many more may wait before logins get a 503
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
+app.config['PASSWORD_HASH_TIMEOUT'] = 10
+load_storage_config(app.config)
 
 db = SQLAlchemy(app)
+metrics = Metrics()
+with app.app_context():
+    install_sqlite_pragmas(db.engine, app.config)
+    init_instrumentation(app, db.engine, metrics)
+init_assets(app)
+fragment_cache = FragmentCache(ttl_seconds=app.config['FRAGMENT_CACHE_TTL'])
 
 # Database Models
 class User(db.Model):
@@ -38,9 +101,14 @@ class UserWorkout(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     template_id = db.Column(db.Integer, db.ForeignKey('workout_template.id'), nullable=False)
-    custom_plan = db.Column(db.JSON)  # JSON structure for customized plan
+    # {"diff": days that differ from the template} (see workouts.py); NULL when unchanged
+    custom_plan = db.Column(db.JSON(none_as_null=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    
+    __table_args__ = (
+        db.Index('ix_user_workout_user_active', 'user_id', 'is_active'),
+    )
 
 class FoodItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -57,6 +125,19 @@ class NutritionLog(db.Model):
     quantity_grams = db.Column(db.Float, nullable=False)
     date = db.Column(db.Date, default=date.today)
     meal_type = db.Column(db.String(20), default='other')  # breakfast, lunch, dinner, snack, other
+    
+    __table_args__ = (
+        db.Index('ix_nutrition_log_user_date', 'user_id', 'date'),
+    )
+
+class DailyNutritionTotal(db.Model):
+    # Per-day macro rollup of NutritionLog, maintained by log_nutrition
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    calories = db.Column(db.Float, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    fat = db.Column(db.Float, nullable=False, default=0)
 
 class ProgressLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -65,15 +146,32 @@ class ProgressLog(db.Model):
     body_fat_percentage = db.Column(db.Float)
     notes = db.Column(db.Text)
     date = db.Column(db.Date, default=date.today)
+    
+    __table_args__ = (
+        db.Index('ix_progress_log_user_date', 'user_id', 'date'),
+    )
+
+class UserCalibration(db.Model):
+    # Online per-user correction to the global model, see calibration.py
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    anchor_weight = db.Column(db.Float)
+    anchor_date = db.Column(db.Date)
+    bias_per_week = db.Column(db.Float, nullable=False, default=0)  # kg/week
+    weight_sum = db.Column(db.Float, nullable=False, default=0)
+    observations = db.Column(db.Integer, nullable=False, default=0)
+    model_version = db.Column(db.String(32))
 
 # Load ML Model
 def load_prediction_model():
     try:
+        # Prefer the exported linear artifact, it loads without scikit-learn
+        model = load_linear_model(MODEL_ARTIFACT, MODEL_PICKLE)
+        if model is not None:
+            return model
+        
         # You'll need to place your .pkl model in the models folder
-        model_path = os.path.join('models', 'weight_prediction_model.pkl')
-        if os.path.exists(model_path):
-            with open(model_path, 'rb') as f:
-                return pickle.load(f)
+        if os.path.exists(MODEL_PICKLE):
+            return load_pickled_model(MODEL_PICKLE)
         else:
             print("Model file not found. Please place your .pkl model in the models folder.")
             return None
@@ -81,9 +179,208 @@ def load_prediction_model():
         print(f"Error loading model: {e}")
         return None
 
-prediction_model = load_prediction_model()
+def model_file_version():
+    # Hash of the model file on disk, part of every prediction cache key
+    for path in (MODEL_PICKLE, MODEL_ARTIFACT):
+        if os.path.exists(path):
+            return file_sha256(path)[:16]
+    return None
+
+# Serves the promoted trained version if there is one, else the model file.
+# Read model_registry.current once per request for a consistent (model, version).
+model_registry = ModelRegistry(
+    lambda: (load_prediction_model(), model_file_version()),
+    FEATURES,
+    check_interval=app.config['MODEL_RELOAD_INTERVAL'],
+    logger=app.logger
+)
+prediction_cache = PredictionCache(
+    max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    ttl_seconds=app.config['PREDICTION_CACHE_TTL']
+)
+inference_queue = MicroBatcher(
+    predict_many,
+    max_batch_size=app.config['PREDICTION_MAX_BATCH'],
+    max_wait=app.config['PREDICTION_BATCH_WINDOW_MS'] / 1000,
+    on_batch=lambda size, seconds: metrics.observe_inference('microbatch', seconds)
+)
+user_cache = UserCache(
+    max_entries=app.config['USER_CACHE_SIZE'],
+    ttl_seconds=app.config['USER_CACHE_TTL']
+)
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_WORKERS'] + app.config['PASSWORD_HASH_MAX_PENDING'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+# Decoded copy of every WorkoutTemplate, reloaded when the table changes
+workout_catalogue = TemplateCatalogue(
+    WorkoutTemplate.__table__,
+    check_interval=app.config['WORKOUT_CATALOGUE_CHECK_INTERVAL']
+)
+
+@app.before_request
+def refresh_prediction_model():
+    # Rate limited inside; picks up a version promoted by another process
+    model_registry.refresh()
+
+def run_single_prediction(model, features):
+    """Returns (predicted_weight, weight_change) for one feature row"""
+    microbatch = app.config['PREDICTION_MICROBATCH']
+    if microbatch == 'auto':
+        microbatch = not isinstance(model, LinearModel)
+    if not microbatch:
+        predicted, change = predict_many(model, [features])
+        return float(predicted[0]), float(change[0])
+    
+    future = inference_queue.submit(features, model)
+    try:
+        return future.result(timeout=app.config['PREDICTION_TIMEOUT'])
+    except FutureTimeout:
+        future.cancel()
+        raise
+
+def global_prediction(active, current_weight, daily_calories, weekly_workout_minutes, weeks_ahead):
+    """Cached {predicted_weight, weight_change} from the global model"""
+    # Identical inputs against the same model version give the same answer
+    key = cache_key(active.version, current_weight, daily_calories,
+                    weekly_workout_minutes, weeks_ahead)
+    result = prediction_cache.get(key)
+    if result is not None:
+        return result
+    
+    # Features in the order the model was trained with; predict_many
+    # clamps the result to a realistic 30-300 kg
+    features = [current_weight, daily_calories, weekly_workout_minutes, weeks_ahead]
+    with metrics.time_inference('single'):
+        predicted_weight, weight_change = run_single_prediction(active.model, features)
+    
+    result = {
+        'predicted_weight': round(predicted_weight, 2),
+        'weight_change': round(weight_change, 2)
+    }
+    app.logger.debug('prediction user=%s inputs=%s result=%s',
+                     session.get('user_id'), key[1:], result)
+    prediction_cache.set(key, result)
+    return result
+
+# Nutrition totals
+MACROS = ('calories', 'protein', 'carbs', 'fat')
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snack', 'other')
+
+def food_macros(food, quantity_grams):
+    multiplier = quantity_grams / 100
+    return {
+        'calories': food.calories_per_100g * multiplier,
+        'protein': food.protein_per_100g * multiplier,
+        'carbs': (food.carbs_per_100g or 0) * multiplier,
+        'fat': (food.fat_per_100g or 0) * multiplier
+    }
+
+def add_to_daily_totals(totals):
+    """Add macros to rollup rows, in the caller's transaction.
+    
+    `totals` is a list of dicts with user_id, date and an amount per macro.
+    """
+    table = DailyNutritionTotal.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.date],
+        set_={name: table.c[name] + stmt.excluded[name] for name in MACROS}
+    )
+    db.session.execute(stmt, totals)
+
+def daily_totals_query():
+    """Full recompute of DailyNutritionTotal from NutritionLog and FoodItem"""
+    multiplier = NutritionLog.quantity_grams / 100
+    return db.session.query(
+        NutritionLog.user_id,
+        NutritionLog.date,
+        func.sum(FoodItem.calories_per_100g * multiplier),
+        func.sum(FoodItem.protein_per_100g * multiplier),
+        func.sum(func.coalesce(FoodItem.carbs_per_100g, 0) * multiplier),
+        func.sum(func.coalesce(FoodItem.fat_per_100g, 0) * multiplier)
+    ).join(FoodItem, NutritionLog.food_id == FoodItem.id).group_by(NutritionLog.user_id, NutritionLog.date)
+
+def get_daily_totals(user_id, day):
+    totals = db.session.get(DailyNutritionTotal, (user_id, day))
+    if totals is None:
+        return {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0}
+    return {'calories': totals.calories, 'protein': totals.protein, 'carbs': totals.carbs, 'fat': totals.fat}
 
 # Helper functions
+def parse_date_arg(name):
+    """Optional YYYY-MM-DD query parameter, raises ValueError if malformed"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'Invalid {name} date, expected YYYY-MM-DD')
+
+def parse_nutrition_entry(entry, today):
+    """Validated (food_id, quantity_grams, date, meal_type) of one nutrition log entry.
+    
+    Raises KeyError for a missing field and TypeError/ValueError for a bad one.
+    """
+    if not isinstance(entry, dict):
+        raise ValueError('entry must be an object')
+    food_id = int(entry['food_id'])
+    quantity_grams = float(entry['quantity_grams'])
+    if not quantity_grams > 0:
+        raise ValueError('quantity_grams must be positive')
+    meal_type = entry.get('meal_type') or 'other'
+    if meal_type not in MEAL_TYPES:
+        raise ValueError(f'meal_type must be one of {list(MEAL_TYPES)}')
+    # Optional explicit date for back-filling past days
+    log_date = datetime.strptime(entry['date'], '%Y-%m-%d').date() if entry.get('date') else today
+    if log_date > today:
+        raise ValueError('date cannot be in the future')
+    return food_id, quantity_grams, log_date, meal_type
+
+def parse_progress_cursor(cursor):
+    """Decode a 'YYYY-MM-DD_id' keyset cursor into (date, id)"""
+    try:
+        day, log_id = cursor.split('_')
+        return datetime.strptime(day, '%Y-%m-%d').date(), int(log_id)
+    except ValueError:
+        return None
+
+def progress_cursor(log):
+    return f"{log.date.strftime('%Y-%m-%d')}_{log.id}"
+
+def update_calibration(user_id, weight, day):
+    """Fold a new weigh-in into the user's calibration, creating it if needed"""
+    state = db.session.get(UserCalibration, user_id)
+    if state is None:
+        state = UserCalibration(user_id=user_id, bias_per_week=0.0, weight_sum=0.0, observations=0)
+        db.session.add(state)
+    
+    active = model_registry.current
+    daily_calories = None
+    if calibration.needs_intake(state, day, active.model):
+        # Mean logged intake since the anchor, at most MAX_INTERVAL_DAYS rollup rows
+        daily_calories = db.session.query(func.avg(DailyNutritionTotal.calories)).filter(
+            DailyNutritionTotal.user_id == user_id,
+            DailyNutritionTotal.date > state.anchor_date,
+            DailyNutritionTotal.date <= day
+        ).scalar()
+    calibration.observe(state, weight, day, daily_calories, active.model, active.version)
+    return state
+
+def load_user_profile(user_id):
+    row = db.session.query(*(getattr(User, name) for name in PROFILE_FIELDS)).filter(User.id == user_id).first()
+    return UserProfile(*row) if row else None
+
+def current_user():
+    """Read-only profile of the logged-in user, loaded at most once per request"""
+    if 'current_user' not in g:
+        user_id = session['user_id']
+        g.current_user = user_cache.get(user_id, lambda: load_user_profile(user_id))
+    return g.current_user
+
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -110,12 +407,19 @@ def register():
             return jsonify({'error': 'Username already exists'}), 400
         if User.query.filter_by(email=data['email']).first():
             return jsonify({'error': 'Email already exists'}), 400
+        # End the reads so the connection goes back to the pool during the slow hash
+        db.session.rollback()
+        
+        try:
+            password_hash = password_hasher.hash(data['password'])
+        except HasherBusy:
+            return jsonify({'error': 'Server busy, try again shortly'}), 503, {'Retry-After': '1'}
         
         # Create new user
         user = User(
             username=data['username'],
             email=data['email'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=password_hash,
             name=data['name'],
             age=int(data['age']),
             gender=data['gender'],
@@ -141,9 +445,34 @@ def register():
 def login():
     if request.method == 'POST':
         data = request.json if request.is_json else request.form
-        user = User.query.filter_by(username=data['username']).first()
+        user = db.session.query(User.id, User.username, User.password_hash).filter_by(
+            username=data['username']
+        ).first()
+        # End the read so the connection goes back to the pool during the slow hash
+        db.session.rollback()
+        
+        # Hashing runs on a bounded pool; when it is full, turn the login
+        # away rather than let a burst of them hold every request thread
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, data['password'])
+        except HasherBusy:
+            error = 'Too many sign-ins right now, please try again shortly'
+            if request.is_json:
+                return jsonify({'error': error}), 503, {'Retry-After': '1'}
+            flash(error)
+            return render_template('login.html'), 503
         
-        if user and check_password_hash(user.password_hash, data['password']):
+        if valid and password_hasher.needs_rehash(user.password_hash):
+            # Move the hash to the configured method while we have the password
+            try:
+                db.session.execute(User.__table__.update().where(User.id == user.id).values(
+                    password_hash=password_hasher.hash(data['password'])
+                ))
+                db.session.commit()
+            except HasherBusy:
+                pass  # Upgraded on a later login instead
+        
+        if valid:
             session['user_id'] = user.id
             session['username'] = user.username
             
@@ -168,21 +497,13 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
     # Get recent progress
     recent_progress = ProgressLog.query.filter_by(user_id=user.id).order_by(ProgressLog.date.desc()).limit(5).all()
     
     # Get today's nutrition
-    today_nutrition = db.session.query(NutritionLog, FoodItem).join(FoodItem).filter(
-        NutritionLog.user_id == user.id,
-        NutritionLog.date == date.today()
-    ).all()
-    
-    total_calories = sum([
-        (log.quantity_grams / 100) * food.calories_per_100g 
-        for log, food in today_nutrition
-    ])
+    total_calories = get_daily_totals(user.id, date.today())['calories']
     
     return render_template('dashboard.html', 
                          user=user, 
@@ -192,54 +513,100 @@ def dashboard():
 @app.route('/workout-planner')
 @login_required
 def workout_planner():
-    templates = WorkoutTemplate.query.all()
+    # The template catalogue is the same for everyone and rarely changes
+    catalogue = workout_catalogue.get(db.session)
+    template_list = fragment_cache.get_or_render(
+        'workout_template_list',
+        lambda: render_template('workout_template_list.html', templates=catalogue.templates),
+        version=catalogue.version
+    )
     user_workouts = UserWorkout.query.filter_by(user_id=session['user_id'], is_active=True).all()
-    return render_template('workout_planner.html', templates=templates, user_workouts=user_workouts)
+    return render_template('workout_planner.html', template_list=template_list, user_workouts=user_workouts)
 
 @app.route('/nutrition-tracker')
 @login_required
 def nutrition_tracker():
-    food_items = FoodItem.query.all()
-    
     # Get today's logs
     today_logs = db.session.query(NutritionLog, FoodItem).join(FoodItem).filter(
         NutritionLog.user_id == session['user_id'],
         NutritionLog.date == date.today()
     ).all()
     
-    return render_template('nutrition_tracker.html', food_items=food_items, today_logs=today_logs)
+    return render_template('nutrition_tracker.html', today_logs=today_logs)
 
 @app.route('/progress-tracker')
 @login_required
 def progress_tracker():
-    progress_logs = ProgressLog.query.filter_by(user_id=session['user_id']).order_by(ProgressLog.date.desc()).all()
-    return render_template('progress_tracker.html', progress_logs=progress_logs)
+    user_id = session['user_id']
+    page_size = app.config['PROGRESS_PAGE_SIZE']
+    newest_first = (ProgressLog.date.desc(), ProgressLog.id.desc())
+    
+    # Keyset pagination: each page starts strictly after the (date, id) cursor
+    query = ProgressLog.query.filter_by(user_id=user_id)
+    cursor = parse_progress_cursor(request.args.get('before', ''))
+    if cursor:
+        query = query.filter(db.tuple_(ProgressLog.date, ProgressLog.id) < cursor)
+    
+    # One extra row tells us whether there is an older page and gives the
+    # last row on this page something to compare against
+    rows = query.order_by(*newest_first).limit(page_size + 1).all()
+    progress_logs = rows[:page_size]
+    older_log = rows[page_size] if len(rows) > page_size else None
+    
+    stats = {
+        'total': ProgressLog.query.filter_by(user_id=user_id).count(),
+        'latest': ProgressLog.query.filter_by(user_id=user_id).order_by(*newest_first).first(),
+        'first': ProgressLog.query.filter_by(user_id=user_id).order_by(ProgressLog.date, ProgressLog.id).first()
+    }
+    
+    return render_template('progress_tracker.html',
+                         progress_logs=progress_logs,
+                         older_log=older_log,
+                         next_cursor=progress_cursor(progress_logs[-1]) if older_log else None,
+                         is_first_page=cursor is None,
+                         stats=stats)
 
 @app.route('/prediction-tool')
 @login_required
 def prediction_tool():
-    user = User.query.get(session['user_id'])
-    return render_template('prediction_tool.html', user=user)
+    return render_template('prediction_tool.html', user=current_user())
 
 # API Routes
 @app.route('/api/workout/select-template', methods=['POST'])
 @login_required
 def select_workout_template():
     data = request.json
-    template_id = data.get('template_id')
+    try:
+        template_id = int(data['template_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'template_id must be an integer'}), 400
     
-    # Deactivate previous workouts
-    UserWorkout.query.filter_by(user_id=session['user_id'], is_active=True).update({'is_active': False})
+    template = workout_catalogue.get(db.session).by_id.get(template_id)
+    if template is None:
+        # Possibly added since the last version check
+        workout_catalogue.invalidate()
+        template = workout_catalogue.get(db.session).by_id.get(template_id)
+    if template is None:
+        return jsonify({'error': 'Workout template not found'}), 404
     
-    # Create new active workout
-    user_workout = UserWorkout(
-        user_id=session['user_id'],
-        template_id=template_id,
-        custom_plan=data.get('custom_plan'),
-        is_active=True
-    )
+    custom_plan = data.get('custom_plan')
+    if custom_plan is not None:
+        try:
+            validate_plan(custom_plan)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        custom_plan = encode_plan(template.weekly_plan, custom_plan)
     
-    db.session.add(user_workout)
+    # Deactivate the previous plan and insert the new one in one transaction,
+    # as two Core statements with no ORM objects to load or flush
+    table = UserWorkout.__table__
+    user_id = session['user_id']
+    db.session.execute(
+        table.update().where(table.c.user_id == user_id, table.c.is_active == True).values(is_active=False)
+    )
+    db.session.execute(
+        table.insert().values(user_id=user_id, template_id=template.id, custom_plan=custom_plan, is_active=True)
+    )
     db.session.commit()
     
     return jsonify({'success': True})
@@ -247,20 +614,89 @@ def select_workout_template():
 @app.route('/api/nutrition/log', methods=['POST'])
 @login_required
 def log_nutrition():
-    data = request.json
+    try:
+        food_id, quantity_grams, log_date, meal_type = parse_nutrition_entry(request.json, date.today())
+    except KeyError as e:
+        return jsonify({'error': f'Missing {e.args[0]}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    food = db.session.get(FoodItem, food_id)
+    if food is None:
+        return jsonify({'error': 'Food item not found'}), 400
     
     nutrition_log = NutritionLog(
         user_id=session['user_id'],
-        food_id=data['food_id'],
-        quantity_grams=data['quantity_grams'],
-        meal_type=data.get('meal_type', 'other')
+        food_id=food.id,
+        quantity_grams=quantity_grams,
+        date=log_date,
+        meal_type=meal_type
     )
     
     db.session.add(nutrition_log)
+    add_to_daily_totals([{
+        'user_id': nutrition_log.user_id,
+        'date': nutrition_log.date,
+        **food_macros(food, nutrition_log.quantity_grams)
+    }])
     db.session.commit()
     
     return jsonify({'success': True})
 
+@app.route('/api/nutrition/log/batch', methods=['POST'])
+@login_required
+def log_nutrition_batch():
+    data = request.json
+    entries = data.get('entries') if isinstance(data, dict) else None
+    max_entries = app.config['NUTRITION_BATCH_MAX_ENTRIES']
+    
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'entries must be a non-empty list'}), 400
+    if len(entries) > max_entries:
+        return jsonify({'error': f'At most {max_entries} entries are allowed per request'}), 400
+    
+    user_id = session['user_id']
+    today = date.today()
+    rows = []
+    for i, entry in enumerate(entries):
+        try:
+            food_id, quantity_grams, log_date, meal_type = parse_nutrition_entry(entry, today)
+        except KeyError as e:
+            return jsonify({'error': f'Entry {i}: missing {e.args[0]}'}), 400
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Entry {i}: {str(e)}'}), 400
+        
+        rows.append({
+            'user_id': user_id,
+            'food_id': food_id,
+            'quantity_grams': quantity_grams,
+            'date': log_date,
+            'meal_type': meal_type
+        })
+    
+    # Validate every food with one IN query
+    food_ids = {row['food_id'] for row in rows}
+    foods = {food.id: food for food in FoodItem.query.filter(FoodItem.id.in_(food_ids))}
+    unknown = sorted(food_ids - foods.keys())
+    if unknown:
+        return jsonify({'error': f'Food items not found: {unknown[:20]}'}), 400
+    
+    # Sum macros per day so the rollup gets one upsert per date
+    totals = {}
+    for row in rows:
+        day = totals.setdefault(row['date'], dict.fromkeys(MACROS, 0.0))
+        for name, amount in food_macros(foods[row['food_id']], row['quantity_grams']).items():
+            day[name] += amount
+    
+    # One executemany and one commit for the whole batch
+    db.session.execute(NutritionLog.__table__.insert(), rows)
+    add_to_daily_totals([
+        {'user_id': user_id, 'date': day, **amounts} for day, amounts in totals.items()
+    ])
+    db.session.commit()
+    
+    return jsonify({'success': True, 'logged': len(rows)})
+
 @app.route('/api/progress/log', methods=['POST'])
 @login_required
 def log_progress():
@@ -276,49 +712,95 @@ def log_progress():
     db.session.add(progress_log)
     
     # Update user's current weight
-    user = User.query.get(session['user_id'])
-    user.current_weight = data['weight']
+    user_id = session['user_id']
+    db.session.execute(
+        User.__table__.update().where(User.id == user_id).values(current_weight=data['weight'])
+    )
+    update_calibration(user_id, float(data['weight']), date.today())
     
     db.session.commit()
+    user_cache.invalidate(user_id)
     
     return jsonify({'success': True})
 
 @app.route('/api/progress/data')
 @login_required
 def get_progress_data():
-    progress_logs = ProgressLog.query.filter_by(user_id=session['user_id']).order_by(ProgressLog.date).all()
+    bucket = request.args.get('bucket')
+    if bucket not in (None, '', 'week', 'month'):
+        return jsonify({'error': 'bucket must be week or month'}), 400
     
-    data = {
-        'dates': [log.date.strftime('%Y-%m-%d') for log in progress_logs],
-        'weights': [log.weight for log in progress_logs],
-        'body_fat': [log.body_fat_percentage for log in progress_logs if log.body_fat_percentage]
-    }
+    try:
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    filters = [ProgressLog.user_id == session['user_id']]
+    if start:
+        filters.append(ProgressLog.date >= start)
+    if end:
+        filters.append(ProgressLog.date <= end)
     
-    return jsonify(data)
+    # Downsample long histories so the payload stays bounded
+    max_points = app.config['PROGRESS_CHART_MAX_POINTS']
+    if not bucket:
+        count, first_day, last_day = db.session.query(
+            func.count(ProgressLog.id), func.min(ProgressLog.date), func.max(ProgressLog.date)
+        ).filter(*filters).one()
+        if count > max_points:
+            bucket = 'week' if (last_day - first_day).days / 7 < max_points else 'month'
+    
+    if not bucket:
+        rows = db.session.query(
+            ProgressLog.date, ProgressLog.weight, ProgressLog.body_fat_percentage
+        ).filter(*filters).order_by(ProgressLog.date, ProgressLog.id).all()
+        
+        return jsonify({
+            'dates': [row.date.strftime('%Y-%m-%d') for row in rows],
+            'weights': [row.weight for row in rows],
+            'body_fat': [row.body_fat_percentage for row in rows if row.body_fat_percentage],
+            'bucket': None
+        })
+    
+    # Aggregate per calendar week or month in SQL, labelled by the first day logged
+    bucket_key = func.strftime('%Y-%W' if bucket == 'week' else '%Y-%m', ProgressLog.date)
+    rows = db.session.query(
+        func.min(ProgressLog.date).label('date'),
+        func.avg(ProgressLog.weight).label('weight'),
+        func.min(ProgressLog.weight).label('min_weight'),
+        func.max(ProgressLog.weight).label('max_weight'),
+        func.avg(ProgressLog.body_fat_percentage).label('body_fat')
+    ).filter(*filters).group_by(bucket_key).order_by(bucket_key).all()
+    
+    return jsonify({
+        'dates': [row.date.strftime('%Y-%m-%d') for row in rows],
+        'weights': [round(row.weight, 2) for row in rows],
+        'min_weights': [row.min_weight for row in rows],
+        'max_weights': [row.max_weight for row in rows],
+        'body_fat': [round(row.body_fat, 2) for row in rows if row.body_fat],
+        'bucket': bucket
+    })
 
 @app.route('/api/predict-weight', methods=['POST'])
 @login_required
 def predict_weight():
-    print(f"[DEBUG] Prediction request received from user {session.get('user_id')}")
-    
-    if not prediction_model:
-        print("[ERROR] Prediction model not available")
+    active = model_registry.current
+    if not active.model:
+        app.logger.error('Prediction model not available')
         return jsonify({'error': 'Prediction model not available'}), 500
     
     # Check if request has JSON data
     if not request.is_json:
-        print("[ERROR] Request is not JSON")
         return jsonify({'error': 'Request must be JSON'}), 400
     
     data = request.json
-    print(f"[DEBUG] Received data: {data}")
     
     # Validate required fields
     required_fields = ['current_weight', 'daily_calories', 'weekly_workout_minutes', 'weeks_ahead']
     missing_fields = [field for field in required_fields if field not in data or data[field] == '']
     
     if missing_fields:
-        print(f"[ERROR] Missing required fields: {missing_fields}")
         return jsonify({'error': f'Missing required fields: {missing_fields}'}), 400
     
     try:
@@ -328,8 +810,6 @@ def predict_weight():
         weekly_workout_minutes = float(data['weekly_workout_minutes'])
         weeks_ahead = int(data['weeks_ahead'])
         
-        print(f"[DEBUG] Parsed values: weight={current_weight}, calories={daily_calories}, workout={weekly_workout_minutes}, weeks={weeks_ahead}")
-        
         # Validate ranges
         if not (20 <= current_weight <= 300):
             return jsonify({'error': 'Current weight must be between 20 and 300 kg'}), 400
@@ -340,77 +820,443 @@ def predict_weight():
         if not (1 <= weeks_ahead <= 52):
             return jsonify({'error': 'Weeks ahead must be between 1 and 52'}), 400
         
-        # Prepare input data as DataFrame with exact feature names the model expects
-        input_data = pd.DataFrame({
-            'current_weight': [current_weight],
-            'daily_calories': [daily_calories],
-            'weekly_workout_minutes': [weekly_workout_minutes],
-            'weeks_ahead': [weeks_ahead]
-        })
-        
-        print(f"[DEBUG] Input DataFrame shape: {input_data.shape}")
-        print(f"[DEBUG] Input DataFrame columns: {list(input_data.columns)}")
-        print(f"[DEBUG] Input DataFrame:\n{input_data}")
-        
-        # Make prediction using DataFrame with proper column names
-        prediction = prediction_model.predict(input_data)
-        predicted_weight = prediction[0]
-        
-        print(f"[DEBUG] Raw prediction: {predicted_weight}")
-        
-        # Ensure realistic bounds (weight shouldn't go below 30 or above 300)
-        predicted_weight = max(30.0, min(300.0, predicted_weight))
-        weight_change = predicted_weight - current_weight
+        result = global_prediction(active, current_weight, daily_calories, weekly_workout_minutes, weeks_ahead)
         
-        result = {
+        # The cache holds the shared global answer; the per-user correction goes on top
+        state = db.session.get(UserCalibration, session['user_id'])
+        adjustment = calibration.adjustment(state, active.version, weeks_ahead)
+        predicted_weight = min(max(result['predicted_weight'] + adjustment, MIN_PREDICTED_WEIGHT),
+                               MAX_PREDICTED_WEIGHT)
+        return jsonify({
             'predicted_weight': round(predicted_weight, 2),
-            'weight_change': round(weight_change, 2)
-        }
-        
-        print(f"[DEBUG] Final result: {result}")
-        
-        return jsonify(result)
+            'weight_change': round(predicted_weight - current_weight, 2),
+            'global_predicted_weight': result['predicted_weight'],
+            'calibration_adjustment': round(adjustment, 2)
+        })
     
     except ValueError as e:
-        error_msg = f'Invalid input data: {str(e)}'
-        print(f"[ERROR] {error_msg}")
-        return jsonify({'error': error_msg}), 400
+        return jsonify({'error': f'Invalid input data: {str(e)}'}), 400
     
     except Exception as e:
-        error_msg = f'Prediction error: {str(e)}'
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': error_msg}), 500
+        app.logger.exception('Prediction failed')
+        return jsonify({'error': f'Prediction error: {str(e)}'}), 500
 
-@app.route('/api/nutrition/summary')
+@app.route('/api/predict-weight/batch', methods=['POST'])
 @login_required
-def get_nutrition_summary():
-    today_logs = db.session.query(NutritionLog, FoodItem).join(FoodItem).filter(
-        NutritionLog.user_id == session['user_id'],
-        NutritionLog.date == date.today()
-    ).all()
+def predict_weight_batch():
+    active = model_registry.current
+    if not active.model:
+        return jsonify({'error': 'Prediction model not available'}), 500
+    
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+    
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be an object'}), 400
+    
+    try:
+        features = scenarios_to_matrix(data.get('scenarios'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid input data: {str(e)}'}), 400
+    
+    try:
+        with metrics.time_inference('batch'):
+            predicted, change = predict_many(active.model, features)
+    except Exception as e:
+        return jsonify({'error': f'Prediction error: {str(e)}'}), 500
+    
+    # The correction is linear in the horizon, so one value per week covers every scenario
+    state = db.session.get(UserCalibration, session['user_id'])
+    per_week = calibration.adjustment(state, active.version, 1)
+    if per_week:
+        predicted, change = calibrate(predicted, features[:, 0], per_week * features[:, 3])
+    
+    return jsonify({
+        'predictions': format_predictions(predicted, change),
+        'calibration_adjustment_per_week': round(per_week, 4)
+    })
+
+@app.route('/api/predict-weight/trajectory', methods=['POST'])
+@login_required
+def predict_weight_trajectory():
+    active = model_registry.current
+    if not active.model:
+        return jsonify({'error': 'Prediction model not available'}), 500
+    
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+    
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be an object'}), 400
+    
+    # weeks_ahead is the horizon: every week from 1 up to it is predicted
+    try:
+        current_weight, daily_calories, weekly_workout_minutes, horizon = parse_inputs(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with metrics.time_inference('trajectory'):
+            weeks, predicted_weights, weight_changes = predict_trajectory(
+                active.model, current_weight, daily_calories, weekly_workout_minutes, horizon
+            )
+    except Exception as e:
+        return jsonify({'error': f'Prediction error: {str(e)}'}), 500
+    
+    # Added outside the memoized trajectory, which is shared by every user
+    state = db.session.get(UserCalibration, session['user_id'])
+    per_week = calibration.adjustment(state, active.version, 1)
+    if per_week:
+        predicted, change = calibrate(predicted_weights, current_weight, per_week * np.asarray(weeks))
+        predicted_weights = np.round(predicted, 2).tolist()
+        weight_changes = np.round(change, 2).tolist()
+    
+    return jsonify({
+        'weeks': list(weeks),
+        'predicted_weights': list(predicted_weights),
+        'weight_changes': list(weight_changes),
+        'calibration_adjustment_per_week': round(per_week, 4)
+    })
+
+@app.route('/api/predict-weight/cache-stats')
+@login_required
+def prediction_cache_stats():
+    stats = prediction_cache.stats()
+    stats['model_version'] = model_registry.current.version
+    return jsonify(stats)
+
+@app.route('/api/foods/search')
+@login_required
+def search_food_items():
+    query = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    return jsonify({'foods': search_foods(db.session, query, limit)})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    authorization = request.headers.get('Authorization', '').encode()
+    if not hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+        return app.response_class('Unauthorized\n', status=401, mimetype='text/plain',
+                                  headers={'WWW-Authenticate': 'Bearer'})
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/dashboard')
+@login_required
+def get_dashboard_data():
+    user_id = session['user_id']
+    today = date.today()
+    
+    # Profile, today's rollup totals and the active workout in one query
+    row = db.session.query(User, DailyNutritionTotal, UserWorkout, WorkoutTemplate.name).outerjoin(
+        DailyNutritionTotal,
+        and_(DailyNutritionTotal.user_id == User.id, DailyNutritionTotal.date == today)
+    ).outerjoin(
+        UserWorkout, and_(UserWorkout.user_id == User.id, UserWorkout.is_active == True)
+    ).outerjoin(
+        WorkoutTemplate, WorkoutTemplate.id == UserWorkout.template_id
+    ).filter(User.id == user_id).order_by(UserWorkout.created_at.desc()).first()
+    
+    if row is None:
+        return jsonify({'error': 'User not found'}), 404
+    user, totals, workout, template_name = row
+    
+    recent_progress = db.session.query(
+        ProgressLog.date, ProgressLog.weight, ProgressLog.body_fat_percentage, ProgressLog.notes
+    ).filter(ProgressLog.user_id == user_id).order_by(
+        ProgressLog.date.desc(), ProgressLog.id.desc()
+    ).limit(5).all()
+    
+    payload = {
+        'user': {
+            'name': user.name,
+            'age': user.age,
+            'gender': user.gender,
+            'height': user.height,
+            'current_weight': user.current_weight,
+            'fitness_goal': user.fitness_goal,
+            'bmi': round(user.current_weight / ((user.height / 100) ** 2), 1)
+        },
+        'recent_progress': [{
+            'date': log.date.strftime('%Y-%m-%d'),
+            'weight': log.weight,
+            'body_fat_percentage': log.body_fat_percentage,
+            'notes': log.notes
+        } for log in recent_progress],
+        'nutrition': {
+            'total_calories': round(totals.calories, 1) if totals else 0.0,
+            'total_protein': round(totals.protein, 1) if totals else 0.0,
+            'total_carbs': round(totals.carbs, 1) if totals else 0.0,
+            'total_fat': round(totals.fat, 1) if totals else 0.0
+        },
+        'active_workout': {
+            'id': workout.id,
+            'template_id': workout.template_id,
+            'template_name': template_name,
+            'started': workout.created_at.strftime('%Y-%m-%d') if workout.created_at else None
+        } if workout else None,
+        'date': today.strftime('%Y-%m-%d')
+    }
+    
+    # Clients revalidate with If-None-Match and get a 304 when nothing changed
+    response = jsonify(payload)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/export/<dataset>')
+@login_required
+def export_history(dataset):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': f'format must be one of {sorted(FORMATS)}'}), 400
+    
+    try:
+        start = parse_date_arg('start')
+        end = parse_date_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = session['user_id']
+    if dataset == 'progress':
+        columns = ['date', 'weight', 'body_fat_percentage', 'notes']
+        query = db.session.query(
+            ProgressLog.date, ProgressLog.weight, ProgressLog.body_fat_percentage, ProgressLog.notes
+        ).filter(ProgressLog.user_id == user_id)
+        date_column, order = ProgressLog.date, (ProgressLog.date, ProgressLog.id)
+    elif dataset == 'nutrition':
+        multiplier = NutritionLog.quantity_grams / 100
+        columns = ['date', 'meal_type', 'food', 'quantity_grams', 'calories', 'protein', 'carbs', 'fat']
+        query = db.session.query(
+            NutritionLog.date, NutritionLog.meal_type, FoodItem.name, NutritionLog.quantity_grams,
+            func.round(FoodItem.calories_per_100g * multiplier, 2),
+            func.round(FoodItem.protein_per_100g * multiplier, 2),
+            func.round(func.coalesce(FoodItem.carbs_per_100g, 0) * multiplier, 2),
+            func.round(func.coalesce(FoodItem.fat_per_100g, 0) * multiplier, 2)
+        ).join(FoodItem, NutritionLog.food_id == FoodItem.id).filter(NutritionLog.user_id == user_id)
+        date_column, order = NutritionLog.date, (NutritionLog.date, NutritionLog.id)
+    else:
+        return jsonify({'error': 'dataset must be progress or nutrition'}), 404
+    
+    if start:
+        query = query.filter(date_column >= start)
+    if end:
+        query = query.filter(date_column <= end)
+    query = query.order_by(*order)
     
-    total_calories = 0
-    total_protein = 0
-    total_carbs = 0
-    total_fat = 0
+    compress = request.args.get('gzip') in ('1', 'true')
+    mimetype, extension = FORMATS[fmt]
+    filename = f'{dataset}.{extension}' + ('.gz' if compress else '')
     
-    for log, food in today_logs:
-        multiplier = log.quantity_grams / 100
-        total_calories += food.calories_per_100g * multiplier
-        total_protein += food.protein_per_100g * multiplier
-        total_carbs += food.carbs_per_100g * multiplier
-        total_fat += food.fat_per_100g * multiplier
+    def chunks():
+        try:
+            yield from stream_query(query, columns, fmt, compress)
+        finally:
+            # The context teardown already removed this session before streaming
+            # began; the query reopened it, so close it to return its connection
+            query.session.close()
+    
+    # The generator keeps the request context (and its DB session) alive while streaming
+    response = Response(
+        stream_with_context(chunks()),
+        mimetype='application/gzip' if compress else mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@app.route('/api/nutrition/summary')
+@login_required
+def get_nutrition_summary():
+    totals = get_daily_totals(session['user_id'], date.today())
     
     return jsonify({
-        'total_calories': round(total_calories, 1),
-        'total_protein': round(total_protein, 1),
-        'total_carbs': round(total_carbs, 1),
-        'total_fat': round(total_fat, 1)
+        'total_calories': round(totals['calories'], 1),
+        'total_protein': round(totals['protein'], 1),
+        'total_carbs': round(totals['carbs'], 1),
+        'total_fat': round(totals['fat'], 1)
     })
 
+# CLI commands
+def upgrade_database():
+    """Create missing tables, then any indexes missing from existing tables"""
+    db.create_all()
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if not db.inspect(db.engine).has_index(table.name, index.name):
+                index.create(bind=db.engine)
+                created.append(index.name)
+    
+    with db.engine.begin() as connection:
+        if create_search_index(connection):
+            created.append('food_item_fts')
+        if create_catalogue_versioning(connection):
+            created.append('catalogue_version')
+    return created
+
+@app.cli.command('import-foods')
+@click.argument('path')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per insert and commit.')
+def import_foods(path, chunk_size):
+    """Bulk load a CSV food catalogue into FoodItem"""
+    upgrade_database()
+    imported, skipped = import_foods_csv(db.session, FoodItem.__table__, path, chunk_size)
+    print(f"Imported {imported} foods.")
+    if skipped:
+        print(f"Skipped {len(skipped)} invalid rows, e.g. lines {skipped[:10]}")
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Bring an existing database up to the current schema"""
+    created = upgrade_database()
+    print(f"Created indexes: {', '.join(created)}" if created else "Database is up to date.")
+
+@app.cli.command('compact-workout-plans')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows read and updated per commit.')
+def compact_workout_plans(chunk_size):
+    """Rewrite custom plans saved as full copies as wrapped diffs against their template"""
+    upgrade_database()
+    catalogue = workout_catalogue.get(db.session)
+    table = UserWorkout.__table__
+    stmt = table.update().where(table.c.id == db.bindparam('row_id')).values(custom_plan=db.bindparam('plan'))
+    last_id = rewritten = saved = 0
+    skipped = []
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.template_id, table.c.custom_plan)
+            .where(table.c.id > last_id, table.c.custom_plan.isnot(None))
+            .order_by(table.c.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row_id, template_id, plan in rows:
+            template = catalogue.by_id.get(template_id)
+            if template is None or is_encoded_plan(plan):
+                continue
+            try:
+                validate_plan(plan)
+            except ValueError:
+                skipped.append(row_id)
+                continue
+            # Diff the full copy as is; reading it as a diff would bring back days it dropped
+            stored = encode_plan(template.weekly_plan, plan)
+            if decode_plan(template.weekly_plan, stored) != plan:
+                skipped.append(row_id)
+                continue
+            updates.append({'row_id': row_id, 'plan': stored})
+            saved += len(json.dumps(plan)) - (len(json.dumps(stored)) if stored else 0)
+        if updates:
+            db.session.execute(stmt, updates)
+        db.session.commit()
+        rewritten += len(updates)
+        last_id = rows[-1][0]
+    print(f"Rewrote {rewritten} custom plans, about {saved} bytes of JSON smaller.")
+    if skipped:
+        print(f"Left {len(skipped)} malformed plans or plans that wouldn't read back the same, e.g. ids {skipped[:10]}")
+
+@app.cli.command('backfill-nutrition-totals')
+def backfill_nutrition_totals():
+    """Rebuild DailyNutritionTotal from every NutritionLog"""
+    upgrade_database()
+    table = DailyNutritionTotal.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['user_id', 'date', 'calories', 'protein', 'carbs', 'fat'],
+        daily_totals_query()
+    ))
+    db.session.commit()
+    print(f"Backfilled {DailyNutritionTotal.query.count()} daily totals.")
+
+@app.cli.command('check-nutrition-totals')
+def check_nutrition_totals():
+    """Compare DailyNutritionTotal with a full recompute from NutritionLog"""
+    expected = {(row[0], row[1]): row[2:] for row in daily_totals_query()}
+    actual = {
+        (row.user_id, row.date): (row.calories, row.protein, row.carbs, row.fat)
+        for row in DailyNutritionTotal.query.all()
+    }
+    
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        want = expected.get(key, (0, 0, 0, 0))
+        got = actual.get(key, (0, 0, 0, 0))
+        if any(abs(w - g) > 1e-6 for w, g in zip(want, got)):
+            mismatches.append((key, want, got))
+    
+    for (user_id, day), want, got in sorted(mismatches)[:20]:
+        print(f"user {user_id} on {day}: expected {want}, rollup has {got}")
+    
+    if mismatches:
+        print(f"{len(mismatches)} of {len(expected)} daily totals are inconsistent.")
+        raise SystemExit(1)
+    print(f"All {len(expected)} daily totals are consistent.")
+
+@app.cli.command('build-analytics')
+@click.option('--chunk-size', default=200_000, show_default=True, help='Log rows read per chunk.')
+@click.option('--parquet', 'parquet_dir', default=None, help='Also write Parquet files to this directory.')
+def build_analytics(chunk_size, parquet_dir):
+    """Recompute the per-user and per-goal analytics summary tables"""
+    # pandas is only needed here, keep it out of the web worker's startup
+    from analytics import build_summaries
+    upgrade_database()
+    users, cohorts = build_summaries(db.engine, chunk_size, parquet_dir)
+    print(f"Summarised {len(users)} users into {len(cohorts)} goal cohorts.")
+    print(cohorts.to_string())
+
+@app.cli.command('train-model')
+@click.option('--block-size', default=5000, show_default=True, help='Users read per block.')
+@click.option('--promote', 'promote_new', is_flag=True,
+              help='Serve the new version if it beats the current model on held-out users.')
+@click.option('--force', is_flag=True, help='With --promote, promote it regardless.')
+def train_model(block_size, promote_new, force):
+    """Train a new model version from ProgressLog and NutritionLog"""
+    from training import train
+    upgrade_database()
+    active = model_registry.current
+    try:
+        with db.engine.connect() as connection:
+            coef, intercept, metadata = train(connection, active.model, block_size)
+    except ValueError as e:
+        print(e)
+        raise SystemExit(1)
+    
+    metadata['baseline_version'] = active.version
+    version = save_version(coef, intercept, FEATURES, metadata)
+    stats = metadata['training']
+    print(f"Saved model version {version} from {stats['examples']} examples ({stats['users']} users).")
+    print(f"Validation RMSE {stats['validation_rmse']} kg, current model {stats['baseline_validation_rmse']} kg.")
+    
+    if promote_new:
+        new, baseline = stats['validation_rmse'], stats['baseline_validation_rmse']
+        if force or baseline is None or (new is not None and new <= baseline):
+            promote(version)
+            print(f"Promoted {version}; running workers switch within {app.config['MODEL_RELOAD_INTERVAL']:g}s.")
+        else:
+            print("Not promoted: it does worse than the current model on held-out users.")
+
+@app.cli.command('promote-model')
+@click.argument('version')
+def promote_model(version):
+    """Serve a saved model version, e.g. to roll back"""
+    try:
+        promote(version)
+    except ValueError as e:
+        print(e)
+        print(f"Saved versions: {', '.join(list_versions()) or 'none'}")
+        raise SystemExit(1)
+    print(f"Promoted {version}.")
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade_database()
     app.run(debug=True)
@@ -0,0 +1,140 @@
+"""
+Fingerprinted, precompressed static assets
+
+Every file under the static folder is read once at startup, hashed, and
+linked as /assets/<hash>/<path> by the `asset_url` template global. The URL
+changes whenever the content does, so responses are cached for a year and
+marked immutable; a stale hash redirects to the current URL.
+
+Text assets are compressed once with gzip, and with brotli when the brotli
+package is installed. Each request is answered with the smallest variant
+its Accept-Encoding allows, straight from memory, with no per-request
+compression. In debug mode files are re-read when their mtime changes.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from flask import abort, redirect, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants only without it
+    brotli = None
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Larger files are sent from disk, uncompressed
+ASSET_MEMORY_LIMIT = 1024 * 1024
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Preferred first when the client accepts both
+ENCODINGS = ('br', 'gzip')
+
+
+def compress_variants(body, mimetype):
+    """{encoding: bytes} for the encodings that make `body` smaller"""
+    if not mimetype or not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+class Asset:
+    __slots__ = ('path', 'mtime', 'digest', 'mimetype', 'body', 'variants')
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        with open(path, 'rb') as f:
+            content = f.read()
+        self.digest = hashlib.sha256(content).hexdigest()[:12]
+        if len(content) <= ASSET_MEMORY_LIMIT:
+            self.body = content
+            self.variants = compress_variants(content, self.mimetype)
+        else:
+            self.body = None
+            self.variants = {}
+
+
+class AssetManifest:
+    """filename (relative to the static folder, '/' separated) -> Asset"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._assets = {}
+        self._lock = threading.Lock()
+        self.scan()
+
+    def scan(self):
+        assets = {}
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                assets[filename] = Asset(path)
+        self._assets = assets
+
+    def get(self, filename, check_mtime=False):
+        asset = self._assets.get(filename)
+        if asset is not None and check_mtime:
+            try:
+                changed = os.stat(asset.path).st_mtime_ns != asset.mtime
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                with self._lock:
+                    self.scan()
+                asset = self._assets.get(filename)
+        return asset
+
+
+def negotiate(asset, accept_encodings):
+    """(encoding or None, body) to send for a request's Accept-Encoding"""
+    for encoding in ENCODINGS:
+        if encoding in asset.variants and accept_encodings[encoding]:
+            return encoding, asset.variants[encoding]
+    return None, asset.body
+
+
+def init_assets(app):
+    """Register the /assets route and the `asset_url` template global on `app`"""
+    manifest = AssetManifest(app.static_folder)
+
+    def asset_url(filename):
+        asset = manifest.get(filename, check_mtime=app.debug)
+        if asset is None:
+            return url_for('static', filename=filename)
+        return url_for('serve_asset', digest=asset.digest, filename=filename)
+
+    @app.route('/assets/<digest>/<path:filename>')
+    def serve_asset(digest, filename):
+        asset = manifest.get(filename, check_mtime=app.debug)
+        if asset is None:
+            abort(404)
+        if digest != asset.digest:
+            # An old page asking for a previous version; send it to the current one
+            return redirect(url_for('serve_asset', digest=asset.digest, filename=filename))
+
+        if asset.body is None:
+            response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.digest)
+        else:
+            encoding, body = negotiate(asset, request.accept_encodings)
+            response = app.response_class(body, mimetype=asset.mimetype)
+            response.set_etag(f'{asset.digest}-{encoding}' if encoding else asset.digest)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            if asset.variants:
+                response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    return manifest
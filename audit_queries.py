@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Audit the SQLite query plans behind each route
+
+Drives every read route with the Flask test client as an existing user,
+records the SELECT statements it runs and asks SQLite for their plans with
+EXPLAIN QUERY PLAN. Exits non-zero if any of them scans a whole table.
+
+Run from the project root against the app database:
+    python audit_queries.py [--user-id 1] [--verbose]
+"""
+
+import argparse
+import sys
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import app, db, User
+
+# (method, path, json body) for the routes to audit. Write routes are left
+# out so the audit never changes the database it inspects.
+ROUTES = [
+    ('GET', '/dashboard', None),
+    ('GET', '/workout-planner', None),
+    ('GET', '/nutrition-tracker', None),
+    ('GET', '/progress-tracker', None),
+    ('GET', '/prediction-tool', None),
+    ('GET', '/api/progress/data', None),
+    ('GET', '/api/nutrition/summary', None),
+    ('GET', '/api/foods/search?q=chicken', None),
+    ('GET', '/api/dashboard', None),
+]
+
+# Catalogue tables that are deliberately read in full
+ALLOWED_SCANS = {'workout_template'}
+
+
+def capture_selects(client, method, path, body):
+    """Run one request and return the (statement, parameters) it selected with"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.open(path, method=method, json=body)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    if response.status_code >= 400:
+        print(f"  {method} {path} returned {response.status_code}")
+    return statements
+
+
+def query_plan(statement, parameters):
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def scanned_tables(plan):
+    """Tables read in full, from plan lines like 'SCAN progress_log'"""
+    tables = []
+    for detail in plan:
+        words = detail.split()
+        if not words or words[0] != 'SCAN':
+            continue
+        # Older SQLite versions print 'SCAN TABLE name'
+        if len(words) > 2 and words[1] == 'TABLE':
+            words = words[1:]
+        # Full-text lookups show up as a scan of the virtual table's index
+        if 'VIRTUAL TABLE INDEX' in detail:
+            continue
+        if len(words) > 1 and words[1] != 'CONSTANT':
+            tables.append(words[1])
+    return tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--user-id', type=int, help='user to browse as (default: the first user)')
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    failures = 0
+    with app.app_context():
+        user_id = args.user_id or db.session.query(db.func.min(User.id)).scalar()
+        if user_id is None:
+            sys.exit('The database has no users to browse as.')
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+
+        for method, path, body in ROUTES:
+            print(f"{method} {path}")
+            for statement, parameters in capture_selects(client, method, path, body):
+                try:
+                    plan = query_plan(statement, parameters)
+                except OperationalError as e:
+                    print(f"  {e.orig} (run 'flask --app app upgrade-db' first?)")
+                    failures += 1
+                    continue
+                scans = [table for table in scanned_tables(plan) if table not in ALLOWED_SCANS]
+                if scans or args.verbose:
+                    print('  ' + ' '.join(statement.split()))
+                    for detail in plan:
+                        print(f"    {detail}")
+                if scans:
+                    print(f"  FULL SCAN of {', '.join(scans)}")
+                    failures += 1
+
+    if failures:
+        print(f"\n{failures} queries fall back to a full table scan.")
+        sys.exit(1)
+    print("\nNo full table scans.")
+
+
+if __name__ == '__main__':
+    main()
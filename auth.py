@@ -0,0 +1,110 @@
+"""
+Session user profile cache and bounded password hashing
+
+UserCache keeps a read-only profile (every User column except the password
+hash) per user id for a short TTL, so protected pages don't load the User
+row on every request. Writes that change a profile call `invalidate`;
+worker processes other than the writer see the change within the TTL.
+
+PasswordHasher hashes with a configurable werkzeug method and runs every
+hash and check on a small thread pool, so a burst of logins can keep at
+most `workers` cores busy and queue at most `max_pending` more. Beyond
+that it raises HasherBusy at once instead of tying up request threads.
+`needs_rehash` spots hashes made with other parameters so the login view
+can upgrade them while it has the plain password.
+"""
+
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import cached_property
+from werkzeug.security import generate_password_hash, check_password_hash
+from cache import TTLCache
+
+PROFILE_FIELDS = ['id', 'username', 'email', 'name', 'age', 'gender', 'height',
+                  'current_weight', 'fitness_goal', 'created_at']
+UserProfile = namedtuple('UserProfile', PROFILE_FIELDS)
+
+
+class UserCache:
+    """UserProfile by user id in a TTLCache"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=30):
+        self._profiles = TTLCache(max_entries, ttl_seconds)
+        # Bumped by invalidate, so a load that raced with any write isn't cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        """Cached profile for `user_id`, calling `load()` on a miss. None is not cached."""
+        profile = self._profiles.get(user_id)
+        if profile is not None:
+            return profile
+        generation = self._generation
+
+        profile = load()
+        if profile is not None:
+            with self._lock:
+                if self._generation == generation:
+                    self._profiles.set(user_id, profile)
+        return profile
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._profiles.pop(user_id)
+
+
+class HasherBusy(Exception):
+    """Too many password hashes already pending"""
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=2, max_pending=16, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    @cached_property
+    def method_prefix(self):
+        # werkzeug fills in default parameters, e.g. 'scrypt' -> 'scrypt:32768:8:1'
+        return generate_password_hash('', method=self.method).split('$', 1)[0]
+
+    def _pool(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hasher')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the hash finishes, even if the caller gives up
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method_prefix
@@ -0,0 +1,89 @@
+"""
+Micro-batching inference queue
+
+Request threads submit one feature row each, with the model to run it on,
+and wait on a Future. A single background thread takes the first waiting
+row, keeps collecting for up to `max_wait` seconds or until
+`max_batch_size` rows are queued, then runs one vectorized prediction per
+model in the batch (normally just one; two around a hot swap) and
+resolves every Future.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, predict, max_batch_size=64, max_wait=0.002, on_batch=None):
+        """`predict(model, matrix)` maps an (n, k) matrix to a tuple of n-length result arrays.
+
+        `on_batch(size, seconds)` is called after each batch, e.g. for metrics.
+        """
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.on_batch = on_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+    def submit(self, row, model):
+        """Queue one feature row for `model`; the Future resolves to a tuple of scalars"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((model, row, future))
+        return future
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self._worker is not None and self._worker.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive() or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Skip requests whose waiter already gave up
+            groups = {}
+            for model, row, future in self._collect():
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(id(model), (model, [], []))
+                    groups[id(model)][1].append(row)
+                    groups[id(model)][2].append(future)
+            for model, rows, futures in groups.values():
+                self._predict(model, rows, futures)
+
+    def _predict(self, model, rows, futures):
+        start = time.perf_counter()
+        try:
+            results = self.predict(model, np.asarray(rows, dtype=float))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for i, future in enumerate(futures):
+            future.set_result(tuple(float(values[i]) for values in results))
+        if self.on_batch is not None:
+            self.on_batch(len(futures), time.perf_counter() - start)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Time and memory of the chunked analytics build on synthetic data
+
+Fills a scratch SQLite database with benchmarks.synthetic, then runs
+analytics.build_summaries in a fresh process per chunk size and reports
+its run time and peak resident memory. A chunk size of 0 reads everything
+in one go, for comparison.
+
+Run from the project root:
+    python -m benchmarks.analytics --users 5000 --days 365 --chunk-sizes 50000,200000,0
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.synthetic import generate
+
+
+def run_build(database, chunk_size, results):
+    from sqlalchemy import create_engine
+    from analytics import build_summaries
+
+    engine = create_engine('sqlite:///' + database)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    users, cohorts = build_summaries(engine, chunk_size or None)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    results.put((elapsed, (peak - baseline) / 1024, len(users), len(cohorts)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--meals-per-day', type=int, default=4)
+    parser.add_argument('--log-probability', type=float, default=0.8,
+                        help='chance that a user logs food on a given day')
+    parser.add_argument('--chunk-sizes', default='50000,200000,0')
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), 'analytics.db')
+    context = multiprocessing.get_context('spawn')
+
+    start = time.perf_counter()
+    counts = generate(database, args.users, args.days, args.meals_per_day, args.log_probability, log=lambda line: None)
+    rows = counts['nutrition_log'] + counts['progress_log']
+    print(f"Generated {rows} log rows for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'chunk':>8} {'seconds':>8} {'rows/s':>10} {'peak MiB':>9} {'users':>7} {'cohorts':>8}")
+    for chunk_size in [int(size) for size in args.chunk_sizes.split(',')]:
+        results = context.Queue()
+        process = context.Process(target=run_build, args=(database, chunk_size, results))
+        process.start()
+        process.join()
+        if process.exitcode:
+            raise SystemExit(f"Analytics build failed with chunk size {chunk_size}")
+        elapsed, peak, users, cohorts = results.get()
+        label = chunk_size or 'all'
+        print(f"{label:>8} {elapsed:>8.1f} {rows / elapsed:>10.0f} {peak:>9.0f} {users:>7} {cohorts:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Login and dashboard latency under concurrent load
+
+Runs dashboard requests on their own, then logins on their own, then both
+together, and reports each route's throughput and latency. The mixed run
+shows how much a burst of logins (password hashing is the most CPU-heavy
+thing the app does) slows the other routes, and how many logins the
+bounded hashing pool turned away with 503.
+
+The hashing settings are read by the app at import, so pass them here:
+    python -m benchmarks.auth --login-threads 16 --hash-workers 2 --hash-max-pending 8
+Stored hashes use werkzeug's default method; with another --hash-method the
+first login of each user also rehashes.
+"""
+
+import argparse
+import os
+
+from benchmarks.routes import open_app, print_header, print_result, run_mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', help='benchmark a copy of this database instead of generating one')
+    parser.add_argument('--users', type=int, default=200, help='synthetic users to generate')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--dashboard-threads', type=int, default=4)
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3.0, help='run time per phase')
+    parser.add_argument('--hash-method', help='PASSWORD_HASH_METHOD, e.g. pbkdf2:sha256:600000')
+    parser.add_argument('--hash-workers', type=int, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--hash-max-pending', type=int, help='PASSWORD_HASH_MAX_PENDING')
+    parser.add_argument('--user-cache-ttl', type=int, help='USER_CACHE_TTL, 0 to load the user every request')
+    args = parser.parse_args()
+
+    for name, value in [('PASSWORD_HASH_METHOD', args.hash_method), ('PASSWORD_HASH_WORKERS', args.hash_workers),
+                        ('PASSWORD_HASH_MAX_PENDING', args.hash_max_pending), ('USER_CACHE_TTL', args.user_cache_ttl)]:
+        if value is not None:
+            os.environ[name] = str(value)
+
+    app, users, catalogue = open_app(args.database, args.users, args.days)
+    print(f"Hashing with {app.config['PASSWORD_HASH_METHOD']} on {app.config['PASSWORD_HASH_WORKERS']} threads, "
+          f"{app.config['PASSWORD_HASH_MAX_PENDING']} more may wait; user cache TTL {app.config['USER_CACHE_TTL']}s")
+
+    phases = [
+        ('dashboard alone', {'dashboard': args.dashboard_threads}),
+        ('logins alone', {'login': args.login_threads}),
+        ('dashboard during logins', {'dashboard': args.dashboard_threads, 'login': args.login_threads}),
+    ]
+    for title, mix in phases:
+        print(f"\n{title}")
+        print_header()
+        for name, result in run_mix(app, mix, users, catalogue, args.seconds).items():
+            print_result(name, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Throughput and tail latency of /api/predict-weight with and without micro-batching
+
+Many threads post distinct inputs (so the prediction cache never hits)
+through the Flask test client. Run from the project root:
+    python -m benchmarks.microbatching --model models/weight_prediction_model.pkl --threads 32
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+
+import app as fittrack
+from model_runtime import load_linear_model, load_pickled_model, export_model
+
+
+def load_model(path, runtime):
+    if runtime == 'pickle':
+        return load_pickled_model(path)
+    artifact = os.path.join(tempfile.mkdtemp(), 'model.json')
+    export_model(path, artifact)
+    return load_linear_model(artifact, path)
+
+
+def prepare_database():
+    # Predictions read the user's calibration, so the schema and a user must exist
+    with fittrack.app.app_context():
+        fittrack.upgrade_database()
+        if fittrack.db.session.get(fittrack.User, 1) is None:
+            fittrack.db.session.add(fittrack.User(
+                id=1, username='bench', email='bench@example.com', password_hash='-', name='Bench',
+                age=30, gender='other', height=175, current_weight=75, fitness_goal='fat_loss'
+            ))
+            fittrack.db.session.commit()
+
+
+def run(threads, requests_per_thread):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = fittrack.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        payloads = [{
+            'current_weight': round(rng.uniform(45, 140), 3),
+            'daily_calories': round(rng.uniform(1200, 3500), 3),
+            'weekly_workout_minutes': round(rng.uniform(0, 600), 3),
+            'weeks_ahead': rng.randint(1, 52)
+        } for _ in range(requests_per_thread)]
+        own = []
+        barrier.wait()
+        for payload in payloads:
+            start = time.perf_counter()
+            response = client.post('/api/predict-weight', json=payload)
+            own.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                with lock:
+                    errors.append(f'{response.status_code}: {response.get_data(as_text=True)[:200]}')
+                return
+        with lock:
+            latencies.extend(own)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        sys.exit(f'{len(errors)} threads got an error response, e.g. {errors[0]}')
+
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default='models/weight_prediction_model.pkl')
+    parser.add_argument('--runtime', choices=['pickle', 'artifact'], default='pickle')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+    args = parser.parse_args()
+
+    prepare_database()
+    fittrack.model_registry.pin(load_model(args.model, args.runtime), args.runtime)
+    # Every request should reach the model
+    fittrack.prediction_cache.max_entries = 0
+
+    print(f"{'mode':>12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, setting in (('direct', False), ('microbatch', True), ('auto', 'auto')):
+        fittrack.app.config['PREDICTION_MICROBATCH'] = setting
+        throughput, p50, p99 = run(args.threads, args.requests)
+        print(f"{mode:>12} {throughput:>8.0f} {p50 * 1e3:>8.2f} {p99 * 1e3:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
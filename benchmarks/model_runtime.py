@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare loading and evaluating the pickled model with the exported JSON artifact
+
+Run from the project root:
+    python -m benchmarks.model_runtime --model models/weight_prediction_model.pkl
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from model_runtime import export_model, load_linear_model, load_pickled_model
+from prediction import FEATURES
+
+# Each snippet runs in a fresh interpreter so import cost is included
+STARTUP_SNIPPETS = {
+    'pickle': "from model_runtime import load_pickled_model; load_pickled_model({pickle!r})",
+    'artifact': "from model_runtime import load_linear_model; load_linear_model({artifact!r}, {pickle!r})",
+}
+
+
+def startup_time(snippet, runs):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-W', 'ignore', '-c', snippet], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def per_prediction(model, row, n):
+    """Mean latency of a one-row DataFrame prediction, as /api/predict-weight does it"""
+    input_data = pd.DataFrame({name: [value] for name, value in zip(FEATURES, row)})
+    start = time.perf_counter()
+    for _ in range(n):
+        model.predict(input_data)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default='models/weight_prediction_model.pkl')
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--predictions', type=int, default=2000)
+    args = parser.parse_args()
+
+    artifact = os.path.join(tempfile.mkdtemp(), 'model.json')
+    if not export_model(args.model, artifact):
+        sys.exit('Model is not linear, nothing to compare.')
+
+    pickled = load_pickled_model(args.model)
+    linear = load_linear_model(artifact, args.model)
+    row = [75.0, 2000.0, 300.0, 8.0]
+    sample = pd.DataFrame([row], columns=FEATURES)
+    assert np.allclose(pickled.predict(sample), linear.predict(sample)), 'paths disagree'
+
+    print(f"{'path':>10} {'startup (ms)':>13} {'predict (us)':>13}")
+    for name, model in (('pickle', pickled), ('artifact', linear)):
+        snippet = STARTUP_SNIPPETS[name].format(pickle=args.model, artifact=artifact)
+        startup = startup_time(snippet, args.startup_runs)
+        latency = per_prediction(model, row, args.predictions)
+        print(f"{name:>10} {startup * 1e3:>13.1f} {latency * 1e6:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare per-item nutrition logging with the batch endpoint
+
+Each path writes into its own scratch SQLite database through the Flask
+test client. Run from the project root:
+    python -m benchmarks.nutrition_logging --sizes 1000,100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, db, User, FoodItem, NutritionLog, upgrade_database
+
+FOOD_COUNT = 200
+
+
+def reset_database():
+    with app.app_context():
+        db.drop_all()
+        upgrade_database()
+        db.session.add(User(username='bench', email='bench@example.com', password_hash='-', name='Bench',
+                            age=30, gender='other', height=175, current_weight=75, fitness_goal='fat_loss'))
+        db.session.add_all([
+            FoodItem(name=f'Food {i}', calories_per_100g=100 + i, protein_per_100g=10, carbs_per_100g=5, fat_per_100g=2)
+            for i in range(FOOD_COUNT)
+        ])
+        db.session.commit()
+
+
+def make_entries(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'food_id': rng.randint(1, FOOD_COUNT),
+        'quantity_grams': rng.randint(20, 400),
+        'meal_type': rng.choice(['breakfast', 'lunch', 'dinner', 'snack'])
+    } for _ in range(n)]
+
+
+def logged_client():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    return client
+
+
+def per_item(entries):
+    client = logged_client()
+    start = time.perf_counter()
+    for entry in entries:
+        response = client.post('/api/nutrition/log', json=entry)
+        assert response.status_code == 200, response.json
+    return time.perf_counter() - start
+
+
+def batched(entries, batch_size):
+    client = logged_client()
+    start = time.perf_counter()
+    for i in range(0, len(entries), batch_size):
+        response = client.post('/api/nutrition/log/batch', json={'entries': entries[i:i + batch_size]})
+        assert response.status_code == 200, response.json
+    return time.perf_counter() - start
+
+
+def row_count():
+    with app.app_context():
+        return NutritionLog.query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000')
+    parser.add_argument('--batch-size', type=int, default=app.config['NUTRITION_BATCH_MAX_ENTRIES'])
+    parser.add_argument('--per-item-max', type=int, default=sys.maxsize,
+                        help='skip the per-item path above this many rows')
+    args = parser.parse_args()
+    app.config['NUTRITION_BATCH_MAX_ENTRIES'] = max(args.batch_size, app.config['NUTRITION_BATCH_MAX_ENTRIES'])
+
+    print(f"{'rows':>8} {'per-item rows/s':>16} {'batch rows/s':>13} {'speedup':>9}")
+    for n in [int(size) for size in args.sizes.split(',')]:
+        entries = make_entries(n)
+
+        single_rate = None
+        if n <= args.per_item_max:
+            reset_database()
+            single_rate = n / per_item(entries)
+            assert row_count() == n
+
+        reset_database()
+        batch_rate = n / batched(entries, args.batch_size)
+        assert row_count() == n
+
+        if single_rate:
+            print(f"{n:>8} {single_rate:>16.0f} {batch_rate:>13.0f} {batch_rate / single_rate:>8.0f}x")
+        else:
+            print(f"{n:>8} {'skipped':>16} {batch_rate:>13.0f} {'':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare the single-row prediction path with the vectorized batch path
+
+Run from the project root:
+    python -m benchmarks.predict_many --model models/weight_prediction_model.pkl
+"""
+
+import argparse
+import pickle
+import time
+import numpy as np
+import pandas as pd
+
+from prediction import FEATURES, predict_many
+
+
+def random_scenarios(n, seed=0):
+    """Random but valid inputs, as an (n, 4) matrix in FEATURES order"""
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(45, 140, n),
+        rng.uniform(1200, 3500, n),
+        rng.uniform(0, 600, n),
+        rng.integers(1, 53, n).astype(float),
+    ])
+
+
+def single_row_path(model, features):
+    """What /api/predict-weight does, once per scenario"""
+    results = []
+    for row in features:
+        input_data = pd.DataFrame({name: [value] for name, value in zip(FEATURES, row)})
+        predicted_weight = max(30.0, min(300.0, model.predict(input_data)[0]))
+        results.append((predicted_weight, predicted_weight - row[0]))
+    return results
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', default='models/weight_prediction_model.pkl')
+    parser.add_argument('--sizes', default='1,100,10000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+
+    print(f"{'rows':>8} {'single-row (s)':>15} {'batch (s)':>12} {'speedup':>9}")
+    for n in [int(size) for size in args.sizes.split(',')]:
+        features = random_scenarios(n)
+
+        batch_predicted, _ = predict_many(model, features)
+        single_predicted = np.array([w for w, _ in single_row_path(model, features)])
+        assert np.allclose(batch_predicted, single_predicted), 'paths disagree'
+
+        single = best_of(lambda: single_row_path(model, features), args.repeat)
+        batch = best_of(lambda: predict_many(model, features), args.repeat)
+        print(f"{n:>8} {single:>15.4f} {batch:>12.6f} {single / batch:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
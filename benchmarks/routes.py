@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of every route through the Flask test client
+
+Runs each scenario below for a fixed time with several threads, each with
+its own logged-in test client for a random synthetic user, and reports
+requests per second and latency percentiles. Results can be saved as a
+baseline and later runs compared against it; a run that is slower than the
+baseline by more than --tolerance exits non-zero.
+
+Uses a scratch database from benchmarks.synthetic, or a copy of --database
+so the write scenarios never touch the original. Run from the project root:
+    python -m benchmarks.routes --save-baseline benchmarks/baselines/routes.json
+    python -m benchmarks.routes --baseline benchmarks/baselines/routes.json
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from benchmarks.synthetic import PASSWORD, generate
+
+# Set for the app by open_app, which /metrics needs to be enabled
+METRICS_TOKEN = 'benchmark'
+
+PREDICTION_INPUT = {'current_weight': 82.5, 'daily_calories': 2100, 'weekly_workout_minutes': 180, 'weeks_ahead': 8}
+
+
+def prediction_input(rng):
+    return {
+        'current_weight': round(rng.uniform(55, 120), 1),
+        'daily_calories': rng.choice(range(1400, 3200, 100)),
+        'weekly_workout_minutes': rng.choice(range(0, 420, 30)),
+        'weeks_ahead': rng.randint(1, 26),
+    }
+
+
+_registrations = itertools.count()
+
+
+def registration(rng):
+    n = f'{os.getpid()}-{next(_registrations)}'
+    return {'username': f'bench{n}', 'email': f'bench{n}@example.com', 'password': PASSWORD, 'name': 'Bench',
+            'age': 30, 'gender': 'other', 'height': 175, 'current_weight': 80, 'fitness_goal': 'maintenance'}
+
+
+# name -> function(rng, user_id, catalogue) returning (method, path, request kwargs, expected status)
+SCENARIOS = {
+    'index': lambda rng, user, c: ('GET', '/', {}, 302),
+    'login': lambda rng, user, c: ('POST', '/login', {'json': {'username': f'user{user}', 'password': PASSWORD}}, 200),
+    'register': lambda rng, user, c: ('POST', '/register', {'json': registration(rng)}, 200),
+    'dashboard': lambda rng, user, c: ('GET', '/dashboard', {}, 200),
+    'api_dashboard': lambda rng, user, c: ('GET', '/api/dashboard', {}, 200),
+    'workout_planner': lambda rng, user, c: ('GET', '/workout-planner', {}, 200),
+    'select_template': lambda rng, user, c: ('POST', '/api/workout/select-template',
+                                             {'json': {'template_id': rng.randint(1, c['templates'])}}, 200),
+    'nutrition_tracker': lambda rng, user, c: ('GET', '/nutrition-tracker', {}, 200),
+    'nutrition_summary': lambda rng, user, c: ('GET', '/api/nutrition/summary', {}, 200),
+    'nutrition_log': lambda rng, user, c: ('POST', '/api/nutrition/log', {'json': {
+        'food_id': rng.randint(1, c['foods']), 'quantity_grams': rng.randint(30, 400), 'meal_type': 'lunch'}}, 200),
+    'nutrition_log_batch': lambda rng, user, c: ('POST', '/api/nutrition/log/batch', {'json': {'entries': [
+        {'food_id': rng.randint(1, c['foods']), 'quantity_grams': rng.randint(30, 400), 'meal_type': 'snack'}
+        for _ in range(20)]}}, 200),
+    'food_search': lambda rng, user, c: ('GET', f"/api/foods/search?q={rng.choice(['food 1', 'cooked', 'grilled 4', 'raw'])}", {}, 200),
+    'progress_tracker': lambda rng, user, c: ('GET', '/progress-tracker', {}, 200),
+    'progress_data': lambda rng, user, c: ('GET', '/api/progress/data', {}, 200),
+    'progress_log': lambda rng, user, c: ('POST', '/api/progress/log', {'json': {'weight': round(rng.uniform(55, 120), 1)}}, 200),
+    'prediction_tool': lambda rng, user, c: ('GET', '/prediction-tool', {}, 200),
+    'predict_weight': lambda rng, user, c: ('POST', '/api/predict-weight', {'json': prediction_input(rng)}, 200),
+    'predict_weight_cached': lambda rng, user, c: ('POST', '/api/predict-weight', {'json': PREDICTION_INPUT}, 200),
+    'predict_batch': lambda rng, user, c: ('POST', '/api/predict-weight/batch',
+                                           {'json': {'scenarios': [prediction_input(rng) for _ in range(100)]}}, 200),
+    'predict_trajectory': lambda rng, user, c: ('POST', '/api/predict-weight/trajectory', {'json': prediction_input(rng)}, 200),
+    'prediction_cache_stats': lambda rng, user, c: ('GET', '/api/predict-weight/cache-stats', {}, 200),
+    'export_progress': lambda rng, user, c: ('GET', '/api/export/progress?format=csv', {}, 200),
+    'metrics': lambda rng, user, c: ('GET', '/metrics', {'headers': {'Authorization': f"Bearer {METRICS_TOKEN}"}}, 200),
+}
+
+PREDICTION_SCENARIOS = {'predict_weight', 'predict_weight_cached', 'predict_batch', 'predict_trajectory'}
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def summarise(latencies, failures, elapsed):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1e3, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1e3, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 3),
+        'errors': len(failures),
+        'error_statuses': sorted(set(failures)),
+    }
+
+
+def run_mix(app, mix, users, catalogue, seconds):
+    """Run scenarios side by side; `mix` maps scenario name -> threads. Returns results by name."""
+    barrier = threading.Barrier(sum(mix.values()) + 1)
+    lock = threading.Lock()
+    latencies = {name: [] for name in mix}
+    failures = {name: [] for name in mix}
+
+    def loop(name, seed):
+        make_request = SCENARIOS[name]
+        rng = random.Random(seed)
+        user = rng.randint(1, users)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user
+        barrier.wait()
+        local, local_failures = [], []
+        while time.perf_counter() < deadline:
+            method, path, kwargs, expected = make_request(rng, user, catalogue)
+            start = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            response.get_data()  # drain streamed bodies
+            local.append(time.perf_counter() - start)
+            if response.status_code != expected:
+                local_failures.append(response.status_code)
+        with lock:
+            latencies[name].extend(local)
+            failures[name].extend(local_failures)
+
+    pool = [threading.Thread(target=loop, args=(name, f'{name}-{i}'))
+            for name, threads in mix.items() for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    deadline = time.perf_counter() + seconds
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {name: summarise(latencies[name], failures[name], elapsed) for name in mix}
+
+
+def run_scenario(app, name, users, catalogue, threads, seconds):
+    return run_mix(app, {name: threads}, users, catalogue, seconds)[name]
+
+
+def print_header():
+    print(f"{'route':>24} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+
+def print_result(name, result):
+    errors = f"{result['errors']}" + (f" {result['error_statuses']}" if result['errors'] else '')
+    print(f"{name:>24} {result['requests']:>9} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} "
+          f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {errors:>7}")
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline. Returns the names that regressed."""
+    regressed = []
+    print(f"\n{'route':>24} {'rps':>10} {'p95':>10}  vs baseline")
+    for name, result in results.items():
+        before = baseline['results'].get(name)
+        if not before or not before['rps'] or not before['p95_ms']:
+            print(f"{name:>24} {'new':>10}")
+            continue
+        rps_change = result['rps'] / before['rps'] - 1
+        p95_change = result['p95_ms'] / before['p95_ms'] - 1
+        flag = ''
+        if rps_change < -tolerance or p95_change > tolerance:
+            flag = '  REGRESSION'
+            regressed.append(name)
+        print(f"{name:>24} {rps_change:>+10.1%} {p95_change:>+10.1%}{flag}")
+    return regressed
+
+
+def copy_database(source):
+    target = os.path.join(tempfile.mkdtemp(), 'routes.db')
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+    return target
+
+
+def open_app(database=None, users=1000, days=180):
+    """Import the app against a copy of `database`, or a freshly generated one.
+
+    Returns (app, highest user id, catalogue sizes for the scenarios).
+    """
+    if database:
+        database = copy_database(database)
+    else:
+        database = os.path.join(tempfile.mkdtemp(), 'routes.db')
+        start = time.perf_counter()
+        counts = generate(database, users=users, days=days, log=lambda line: None)
+        print(f"Generated {counts['nutrition_log']} nutrition and {counts['progress_log']} progress logs "
+              f"for {counts['user']} users in {time.perf_counter() - start:.1f}s")
+
+    # The app binds its database at import
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ['METRICS_TOKEN'] = METRICS_TOKEN
+    from app import app, db, User, FoodItem, WorkoutTemplate
+
+    logging.getLogger('werkzeug').setLevel(logging.CRITICAL)
+    app.logger.setLevel(logging.CRITICAL)
+    with app.app_context():
+        highest_user = db.session.query(db.func.max(User.id)).scalar() or 0
+        catalogue = {
+            'foods': db.session.query(db.func.max(FoodItem.id)).scalar() or 1,
+            'templates': db.session.query(db.func.max(WorkoutTemplate.id)).scalar() or 1,
+        }
+    if not highest_user:
+        sys.exit('The database has no users.')
+    return app, highest_user, catalogue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database', help='benchmark a copy of this database instead of generating one')
+    parser.add_argument('--users', type=int, default=1000, help='synthetic users to generate')
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=2.0, help='run time per scenario')
+    parser.add_argument('--only', help='comma separated scenario names')
+    parser.add_argument('--baseline', help='compare against this saved run')
+    parser.add_argument('--save-baseline', help='write this run to a JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed fractional drop in rps or rise in p95 before a route counts as regressed')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    app, users, catalogue = open_app(args.database, args.users, args.days)
+    from app import model_registry
+    if model_registry.current.model is None:
+        skipped = [name for name in names if name in PREDICTION_SCENARIOS]
+        if skipped:
+            print(f"No prediction model loaded, skipping {', '.join(skipped)}")
+        names = [name for name in names if name not in PREDICTION_SCENARIOS]
+
+    print_header()
+    results = {}
+    for name in names:
+        results[name] = run_scenario(app, name, users, catalogue, args.threads, args.seconds)
+        print_result(name, results[name])
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'created': date.today().isoformat(),
+                'python': platform.python_version(),
+                'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs',
+                'settings': {'users': users, 'days': args.days, 'threads': args.threads, 'seconds': args.seconds,
+                             'database': args.database or 'synthetic'},
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.tolerance)
+        if regressed:
+            print(f"\n{len(regressed)} routes regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+    if any(result['errors'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write load test for the SQLite storage settings
+
+Starts several worker processes (like gunicorn workers), each running reader
+and writer threads against the app through the Flask test client, once with
+SQLite's stock settings and once with the tuned defaults from storage.py.
+
+Run from the project root:
+    python -m benchmarks.sqlite_concurrency --workers 4 --threads 4 --seconds 10
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+PROFILES = {
+    # What SQLite and pysqlite do out of the box
+    'stock': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE_KB': '2000',
+        'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    },
+    # storage.DEFAULTS
+    'tuned': {},
+}
+
+WRITE_SHARE = 0.2
+USERS = 20
+
+
+def configure(profile, database):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ.update(PROFILES[profile])
+
+
+def setup_database(profile, database):
+    configure(profile, database)
+    from datetime import date, timedelta
+    from app import app, db, User, ProgressLog, upgrade_database
+
+    with app.app_context():
+        upgrade_database()
+        db.session.add_all([
+            User(username=f'user{i}', email=f'user{i}@example.com', password_hash='-', name=f'User {i}',
+                 age=30, gender='other', height=175, current_weight=80, fitness_goal='fat_loss')
+            for i in range(1, USERS + 1)
+        ])
+        start = date(2023, 1, 1)
+        db.session.add_all([
+            ProgressLog(user_id=user_id, weight=80 - day * 0.01, date=start + timedelta(days=day))
+            for user_id in range(1, USERS + 1) for day in range(365)
+        ])
+        db.session.commit()
+
+
+def run_worker(profile, database, threads, seconds, results):
+    configure(profile, database)
+    import threading
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.CRITICAL)
+    app.logger.setLevel(logging.CRITICAL)
+    deadline = time.perf_counter() + seconds
+    lock = threading.Lock()
+    stats = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+
+    def loop(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = rng.randint(1, USERS)
+        while time.perf_counter() < deadline:
+            is_write = rng.random() < WRITE_SHARE
+            start = time.perf_counter()
+            if is_write:
+                response = client.post('/api/progress/log', json={'weight': round(rng.uniform(60, 90), 1)})
+            else:
+                response = client.get('/api/progress/data?bucket=week')
+            elapsed = time.perf_counter() - start
+            with lock:
+                stats['latencies'].append(elapsed)
+                if response.status_code >= 500:
+                    stats['errors'] += 1
+                else:
+                    stats['writes' if is_write else 'reads'] += 1
+
+    workers = [threading.Thread(target=loop, args=(os.getpid() * 100 + i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(stats)
+
+
+def run_profile(profile, workers, threads, seconds):
+    context = multiprocessing.get_context('spawn')
+    database = os.path.join(tempfile.mkdtemp(), 'load.db')
+
+    setup = context.Process(target=setup_database, args=(profile, database))
+    setup.start()
+    setup.join()
+
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(profile, database, threads, seconds, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for stats in collected for latency in stats['latencies'])
+    return {
+        'reads': sum(stats['reads'] for stats in collected) / seconds,
+        'writes': sum(stats['writes'] for stats in collected) / seconds,
+        'errors': sum(stats['errors'] for stats in collected),
+        'p50': latencies[len(latencies) // 2] if latencies else 0,
+        'p99': latencies[int(len(latencies) * 0.99)] if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'reads/s':>9} {'writes/s':>9} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for profile in PROFILES:
+        r = run_profile(profile, args.workers, args.threads, args.seconds)
+        print(f"{profile:>8} {r['reads']:>9.0f} {r['writes']:>9.0f} {r['errors']:>7} "
+              f"{r['p50'] * 1e3:>8.1f} {r['p99'] * 1e3:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
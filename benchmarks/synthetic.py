@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Synthetic FitTrack data at configurable scale
+
+Creates the app schema in an SQLite file and fills User, FoodItem,
+WorkoutTemplate, UserWorkout, NutritionLog, ProgressLog and the
+DailyNutritionTotal rollup. Rows are drawn with NumPy one block of users
+at a time and written with sqlite3 executemany, one transaction per block.
+The log tables' secondary indexes are dropped for the load and rebuilt
+once at the end. Every user's password is "password".
+
+Run from the project root, e.g. for roughly 50M nutrition log rows:
+    python -m benchmarks.synthetic /tmp/fittrack-large.db --users 100000 --days 365 --log-probability 0.35
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+import numpy as np
+
+GOALS = ['weight_loss', 'muscle_gain', 'strength', 'endurance', 'maintenance']
+GENDERS = ['male', 'female', 'other']
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+EXERCISES = ['Squats', 'Bench press', 'Deadlift', 'Pull-ups', 'Rows', 'Lunges', 'Plank', 'Running',
+             'Cycling', 'Rowing', 'Overhead press', 'Push-ups', 'Burpees', 'Jump rope', 'Yoga']
+TEMPLATE_GOALS = ['strength', 'fat_loss', 'endurance', 'muscle_growth']
+
+START_DATE = date(2024, 1, 1)
+USER_BLOCK = 2000
+PASSWORD = 'password'
+
+# Secondary indexes on these are rebuilt after loading
+BULK_TABLES = ('nutrition_log', 'progress_log', 'user_workout')
+
+
+def _create_schema(database):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    from app import app, upgrade_database
+
+    with app.app_context():
+        upgrade_database()
+
+
+def create_schema(database):
+    """Create (or finish) the app schema in a separate process.
+
+    The app binds its database at import, so a fresh interpreter is the
+    only way to point it at `database` from inside another program.
+    """
+    process = multiprocessing.get_context('spawn').Process(target=_create_schema, args=(database,))
+    process.start()
+    process.join()
+    if process.exitcode:
+        raise RuntimeError(f'Creating the schema in {database} failed')
+
+
+def drop_bulk_indexes(connection):
+    names = [row[0] for row in connection.execute(
+        f"SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND tbl_name IN ({', '.join('?' * len(BULK_TABLES))})", BULK_TABLES
+    )]
+    for name in names:
+        connection.execute(f'DROP INDEX {name}')
+    return names
+
+
+def workout_templates(rng, count):
+    templates = []
+    for i in range(count):
+        plan = {
+            day: [str(e) for e in rng.choice(EXERCISES, size=rng.integers(0, 6), replace=False)]
+            for day in WEEKDAYS
+        }
+        goal = TEMPLATE_GOALS[i % len(TEMPLATE_GOALS)]
+        templates.append((f'{goal.replace("_", " ").title()} Plan {i + 1}', goal,
+                          f'Synthetic {goal} programme', json.dumps(plan)))
+    return templates
+
+
+def nutrition_rows(rng, first_user, users, days, meals_per_day, log_probability, food_count, dates):
+    """Rows for one block of users, in (user, day) order"""
+    logged = rng.random((users, days)) < log_probability
+    user_index, day_index = np.nonzero(logged)
+    user_ids = np.repeat(user_index + first_user, meals_per_day)
+    day_index = np.repeat(day_index, meals_per_day)
+    meals = np.tile(np.arange(meals_per_day) % len(MEAL_TYPES), len(user_index))
+    food_ids = rng.integers(1, food_count + 1, size=user_ids.size)
+    grams = np.round(rng.uniform(30, 400, size=user_ids.size), 1)
+    return zip(user_ids.tolist(), food_ids.tolist(), grams.tolist(),
+               [dates[d] for d in day_index.tolist()], [MEAL_TYPES[m] for m in meals.tolist()])
+
+
+def progress_rows(rng, first_user, users, days, weigh_in_every, dates, start_weights):
+    """Weigh-ins following a per-user linear trend plus noise, and each user's last weight"""
+    weigh_days = np.arange(0, days, weigh_in_every)
+    trends = rng.uniform(-0.12, 0.06, size=users)  # kg/day
+    weights = (start_weights[:, None] + trends[:, None] * weigh_days[None, :]
+               + rng.normal(0, 0.4, size=(users, weigh_days.size)))
+    weights = np.clip(np.round(weights, 1), 35, 250)
+    user_ids = np.repeat(np.arange(first_user, first_user + users), weigh_days.size)
+    day_index = np.tile(weigh_days, users)
+    rows = zip(user_ids.tolist(), weights.ravel().tolist(), [dates[d] for d in day_index.tolist()])
+    return rows, weights[:, -1]
+
+
+def generate(database, users=1000, days=365, meals_per_day=4, log_probability=0.8, weigh_in_every=7,
+             foods=2000, templates=12, seed=0, log=print):
+    """Fill `database` with synthetic data. Returns row counts per table."""
+    from werkzeug.security import generate_password_hash
+
+    create_schema(database)
+    rng = np.random.default_rng(seed)
+    dates = [(START_DATE + timedelta(days=d)).isoformat() for d in range(days)]
+    password_hash = generate_password_hash(PASSWORD)
+    counts = dict.fromkeys(['user', 'food_item', 'workout_template', 'user_workout',
+                            'nutrition_log', 'progress_log', 'daily_nutrition_total'], 0)
+
+    connection = sqlite3.connect(database)
+    connection.execute('PRAGMA synchronous = OFF')
+    connection.execute('PRAGMA cache_size = -262144')
+    dropped = drop_bulk_indexes(connection)
+
+    with connection:
+        connection.executemany(
+            'INSERT INTO food_item (name, calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(f'Food {i} {["raw", "cooked", "baked", "grilled"][i % 4]}', *np.round(values, 1).tolist())
+             for i, values in enumerate(rng.uniform([20, 0, 0, 0], [600, 40, 80, 40], size=(foods, 4)))]
+        )
+        connection.executemany(
+            'INSERT INTO workout_template (name, goal, description, weekly_plan) VALUES (?, ?, ?, ?)',
+            workout_templates(rng, templates)
+        )
+    counts['food_item'], counts['workout_template'] = foods, templates
+
+    start = time.perf_counter()
+    for first in range(1, users + 1, USER_BLOCK):
+        block = min(USER_BLOCK, users - first + 1)
+        weigh_ins, current_weights = progress_rows(rng, first, block, days, weigh_in_every, dates,
+                                                   np.round(rng.uniform(50, 130, size=block), 1))
+        with connection:
+            connection.executemany(
+                'INSERT INTO user (id, username, email, password_hash, name, age, gender, height, '
+                'current_weight, fitness_goal, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(i, f'user{i}', f'user{i}@example.com', password_hash, f'User {i}', int(age),
+                  GENDERS[gender], float(height), float(weight), GOALS[goal], f'{START_DATE} 00:00:00')
+                 for i, age, gender, height, weight, goal in zip(
+                     range(first, first + block), rng.integers(18, 70, block), rng.integers(0, 3, block),
+                     np.round(rng.uniform(150, 200, block), 1), current_weights, rng.integers(0, len(GOALS), block))]
+            )
+            workout_users = [i for i in range(first, first + block) if rng.random() < 0.5]
+            connection.executemany(
+                'INSERT INTO user_workout (user_id, template_id, custom_plan, created_at, is_active) '
+                'VALUES (?, ?, NULL, ?, 1)',
+                [(i, int(rng.integers(1, templates + 1)), f'{START_DATE} 00:00:00') for i in workout_users]
+            )
+            cursor = connection.executemany(
+                'INSERT INTO nutrition_log (user_id, food_id, quantity_grams, date, meal_type) VALUES (?, ?, ?, ?, ?)',
+                nutrition_rows(rng, first, block, days, meals_per_day, log_probability, foods, dates)
+            )
+            counts['nutrition_log'] += cursor.rowcount
+            cursor = connection.executemany(
+                'INSERT INTO progress_log (user_id, weight, date) VALUES (?, ?, ?)', weigh_ins
+            )
+            counts['progress_log'] += cursor.rowcount
+        counts['user'] += block
+        counts['user_workout'] += len(workout_users)
+        elapsed = time.perf_counter() - start
+        log(f"  {counts['user']}/{users} users, {counts['nutrition_log']} nutrition logs "
+            f"({counts['nutrition_log'] / elapsed:.0f} rows/s)")
+
+    with connection:
+        # Same totals the app maintains on every log write
+        cursor = connection.execute("""
+            INSERT INTO daily_nutrition_total (user_id, date, calories, protein, carbs, fat)
+            SELECT n.user_id, n.date,
+                   SUM(f.calories_per_100g * n.quantity_grams / 100.0),
+                   SUM(f.protein_per_100g * n.quantity_grams / 100.0),
+                   SUM(f.carbs_per_100g * n.quantity_grams / 100.0),
+                   SUM(f.fat_per_100g * n.quantity_grams / 100.0)
+            FROM nutrition_log AS n JOIN food_item AS f ON f.id = n.food_id
+            GROUP BY n.user_id, n.date
+        """)
+        counts['daily_nutrition_total'] = cursor.rowcount
+    connection.close()
+
+    log(f"  rebuilding indexes: {', '.join(dropped)}")
+    create_schema(database)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('database', help='SQLite file to create')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--meals-per-day', type=int, default=4)
+    parser.add_argument('--log-probability', type=float, default=0.8,
+                        help='chance that a user logs food on a given day')
+    parser.add_argument('--weigh-in-every', type=int, default=7, help='days between weigh-ins')
+    parser.add_argument('--foods', type=int, default=2000)
+    parser.add_argument('--templates', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+
+    start = time.perf_counter()
+    counts = generate(os.path.abspath(args.database), args.users, args.days, args.meals_per_day,
+                      args.log_probability, args.weigh_in_every, args.foods, args.templates, args.seed)
+    print(f"Generated in {time.perf_counter() - start:.1f}s:")
+    for table, count in counts.items():
+        print(f"  {table:>22} {count:>12}")
+
+
+if __name__ == '__main__':
+    main()
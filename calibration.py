@@ -0,0 +1,91 @@
+"""
+Per-user calibration of the global weight prediction model
+
+Each user keeps a handful of numbers: the last weigh-in used as an anchor
+and an exponentially weighted mean of how far their real weekly weight
+change has differed from what the global model expected for the calories
+they logged. Every new weigh-in folds one residual into that mean in
+constant time, and predictions add the (shrunk) bias per week ahead.
+"""
+
+import numpy as np
+from prediction import FEATURE_RANGES, predict_many
+
+# Intervals shorter than this are mostly water weight; keep the old anchor
+MIN_INTERVAL_DAYS = 3
+# After a long gap the interval says little about current habits; re-anchor only
+MAX_INTERVAL_DAYS = 56
+# Weight of older residuals relative to the newest one
+DECAY = 0.9
+# Pseudo-observations of "no bias" that a new user's bias is shrunk towards
+PRIOR_WEIGHT = 2.0
+# Limits in kg/week on a single residual and on the applied correction
+MAX_RESIDUAL_PER_WEEK = 2.0
+MAX_BIAS_PER_WEEK = 1.0
+# Model input for the interval, since workout minutes are not logged
+DEFAULT_WORKOUT_MINUTES = 150
+
+
+def model_weekly_rate(model, weight, daily_calories, workout_minutes, weeks):
+    """Weekly weight change the global model expects over `weeks`"""
+    low, high, _ = FEATURE_RANGES['daily_calories']
+    horizon = max(1, round(weeks))
+    _, change = predict_many(model, [[weight, min(max(daily_calories, low), high), workout_minutes, horizon]])
+    return float(change[0]) / horizon
+
+
+def reset(state, model_version):
+    state.bias_per_week = 0.0
+    state.weight_sum = 0.0
+    state.observations = 0
+    state.model_version = model_version
+
+
+def needs_intake(state, day, model):
+    """Whether `observe` would use the mean intake for a weigh-in on `day`"""
+    if model is None or state.anchor_date is None:
+        return False
+    return MIN_INTERVAL_DAYS <= (day - state.anchor_date).days <= MAX_INTERVAL_DAYS
+
+
+def observe(state, weight, day, daily_calories, model, model_version,
+            workout_minutes=DEFAULT_WORKOUT_MINUTES):
+    """Fold one weigh-in into `state` in O(1). Returns True if the bias moved.
+
+    `state` is anything with the UserCalibration attributes. `daily_calories`
+    is the mean logged intake since the anchor, or None if nothing was logged.
+    """
+    if state.anchor_date is None:
+        state.anchor_weight, state.anchor_date = weight, day
+        return False
+
+    days = (day - state.anchor_date).days
+    if days < MIN_INTERVAL_DAYS:
+        return False
+
+    updated = False
+    if daily_calories and needs_intake(state, day, model):
+        # A bias is only meaningful relative to the model it was learned against
+        if state.model_version != model_version:
+            reset(state, model_version)
+        weeks = days / 7
+        expected = model_weekly_rate(model, state.anchor_weight, daily_calories, workout_minutes, weeks)
+        residual = np.clip((weight - state.anchor_weight) / weeks - expected,
+                           -MAX_RESIDUAL_PER_WEEK, MAX_RESIDUAL_PER_WEEK)
+        # Longer intervals are less noisy, so they count for more (up to 4 weeks' worth)
+        step = min(weeks, 4.0)
+        state.weight_sum = DECAY * state.weight_sum + step
+        state.bias_per_week += step / state.weight_sum * (float(residual) - state.bias_per_week)
+        state.observations += 1
+        updated = True
+
+    state.anchor_weight, state.anchor_date = weight, day
+    return updated
+
+
+def adjustment(state, model_version, weeks_ahead):
+    """Correction in kg to add to a global prediction `weeks_ahead` out"""
+    if state is None or not state.weight_sum or state.model_version != model_version:
+        return 0.0
+    bias = state.bias_per_week * state.weight_sum / (state.weight_sum + PRIOR_WEIGHT)
+    return float(np.clip(bias, -MAX_BIAS_PER_WEEK, MAX_BIAS_PER_WEEK)) * weeks_ahead
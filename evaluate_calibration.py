@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Replay logged weigh-ins to evaluate per-user calibration
+
+Walks every user's ProgressLog in date order. Before folding each weigh-in
+into the user's calibration, predicts it from the previous anchor with the
+global model alone and with the calibration learned so far, so every error
+is measured on data the calibration has not seen yet. Also times each
+O(1) update, grouped by how many updates the user had already had.
+
+Run from the project root against the app database:
+    python evaluate_calibration.py [--limit-users 1000]
+"""
+
+import argparse
+import sys
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+import numpy as np
+
+import calibration
+from app import app, db, ProgressLog, DailyNutritionTotal, model_registry
+
+# Update cost is reported for users with this many earlier updates
+HISTORY_BUCKETS = [(0, 10), (10, 50), (50, 200), (200, None)]
+
+
+def new_state():
+    return SimpleNamespace(anchor_weight=None, anchor_date=None, bias_per_week=0.0,
+                           weight_sum=0.0, observations=0, model_version=None)
+
+
+def load_calories(user_id):
+    return dict(db.session.query(DailyNutritionTotal.date, DailyNutritionTotal.calories)
+                .filter(DailyNutritionTotal.user_id == user_id))
+
+
+def interval_calories(calories_by_day, start, end):
+    """Mean logged calories for the days after `start` up to and including `end`"""
+    days = [calories_by_day[day] for day in
+            (start + timedelta(days=i) for i in range(1, (end - start).days + 1))
+            if day in calories_by_day]
+    return sum(days) / len(days) if days else None
+
+
+def replay_user(active, logs, calories_by_day, errors, costs):
+    state = new_state()
+    for weight, day in logs:
+        daily_calories = None
+        if state.anchor_date is not None:
+            days = (day - state.anchor_date).days
+            daily_calories = interval_calories(calories_by_day, state.anchor_date, day)
+            if daily_calories and calibration.MIN_INTERVAL_DAYS <= days <= calibration.MAX_INTERVAL_DAYS:
+                weeks = days / 7
+                rate = calibration.model_weekly_rate(active.model, state.anchor_weight, daily_calories,
+                                                     calibration.DEFAULT_WORKOUT_MINUTES, weeks)
+                global_prediction = state.anchor_weight + rate * weeks
+                calibrated = global_prediction + calibration.adjustment(state, active.version, weeks)
+                errors['global'].append(abs(weight - global_prediction))
+                errors['calibrated'].append(abs(weight - calibrated))
+
+        history = state.observations
+        start = time.perf_counter_ns()
+        calibration.observe(state, weight, day, daily_calories, active.model, active.version)
+        costs.append((history, time.perf_counter_ns() - start))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--limit-users', type=int, help='only replay the first N users')
+    args = parser.parse_args()
+
+    active = model_registry.current
+    if active.model is None:
+        sys.exit('No prediction model is loaded; nothing to calibrate against.')
+
+    errors = {'global': [], 'calibrated': []}
+    costs = []
+    users = 0
+    with app.app_context():
+        rows = db.session.query(ProgressLog.user_id, ProgressLog.weight, ProgressLog.date).order_by(
+            ProgressLog.user_id, ProgressLog.date, ProgressLog.id
+        ).execution_options(yield_per=1000)
+
+        current_user, logs = None, []
+        for user_id, weight, day in rows:
+            if user_id != current_user:
+                if logs:
+                    replay_user(active, logs, load_calories(current_user), errors, costs)
+                    users += 1
+                    if args.limit_users and users >= args.limit_users:
+                        logs = []
+                        break
+                current_user, logs = user_id, []
+            logs.append((weight, day))
+        if logs:
+            replay_user(active, logs, load_calories(current_user), errors, costs)
+            users += 1
+
+    if not errors['global']:
+        sys.exit(f'Replayed {users} users but found no weigh-in intervals with logged calories.')
+
+    global_errors = np.asarray(errors['global'])
+    calibrated_errors = np.asarray(errors['calibrated'])
+    print(f"Replayed {len(costs)} weigh-ins for {users} users, {len(global_errors)} scored intervals")
+    print(f"{'':>12} {'MAE kg':>8} {'RMSE kg':>8} {'p90 kg':>8}")
+    for label, values in [('global', global_errors), ('calibrated', calibrated_errors)]:
+        print(f"{label:>12} {values.mean():>8.3f} {np.sqrt((values ** 2).mean()):>8.3f} "
+              f"{np.percentile(values, 90):>8.3f}")
+    improved = (calibrated_errors < global_errors).mean()
+    print(f"Calibrated prediction was closer on {improved:.1%} of intervals")
+
+    print(f"\n{'updates before':>15} {'count':>8} {'mean us':>8} {'p99 us':>8}")
+    history = np.asarray([h for h, _ in costs])
+    nanoseconds = np.asarray([c for _, c in costs], dtype=float)
+    for low, high in HISTORY_BUCKETS:
+        selected = nanoseconds[(history >= low) & (history < (high if high is not None else np.inf))]
+        if selected.size:
+            label = f"{low}-{high - 1}" if high is not None else f"{low}+"
+            print(f"{label:>15} {selected.size:>8} {selected.mean() / 1e3:>8.1f} "
+                  f"{np.percentile(selected, 99) / 1e3:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Streaming CSV/NDJSON export
+
+Rows are pulled from the database in fixed-size batches (`yield_per`) and
+encoded into ~64 KiB chunks as they arrive, optionally gzip-compressed on
+the fly, so memory use does not grow with the size of a user's history.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+YIELD_PER = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_rows(rows, columns, fmt):
+    """Yield text chunks for an iterable of row tuples"""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(dict(zip(columns, map(json_value, row)))))
+            buffer.write('\n')
+
+    for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks without holding more than one in memory"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_query(query, columns, fmt, compress=False):
+    """Encoded chunks for a SQLAlchemy query, read YIELD_PER rows at a time"""
+    rows = query.execution_options(yield_per=YIELD_PER)
+    chunks = encode_rows(rows, columns, fmt)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
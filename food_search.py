@@ -0,0 +1,132 @@
+"""
+Full-text search over the food catalogue
+
+An SQLite FTS5 table mirrors food_item.name (kept in sync by triggers), so
+prefix searches stay fast with hundreds of thousands of foods. Also holds
+the chunked CSV importer used to load large catalogues.
+"""
+
+import csv
+import re
+from sqlalchemy import text
+
+FTS_TABLE = 'food_item_fts'
+
+# External-content FTS5 index over food_item.name plus the triggers that
+# keep it in step with inserts, updates and deletes.
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, content='food_item', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS food_item_fts_insert AFTER INSERT ON food_item BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS food_item_fts_delete AFTER DELETE ON food_item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS food_item_fts_update AFTER UPDATE OF name ON food_item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+MAX_SEARCH_LIMIT = 50
+
+CSV_COLUMNS = ['name', 'calories_per_100g', 'protein_per_100g', 'carbs_per_100g', 'fat_per_100g']
+
+
+def create_search_index(connection):
+    """Create the FTS table and triggers if missing. Returns True if it was created."""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first()
+    if exists:
+        return False
+
+    for statement in FTS_SCHEMA:
+        connection.execute(text(statement))
+    # Index the foods that were already in the table
+    connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_foods(session, query, limit=20):
+    """Foods whose name words start with the query words, best matches first.
+
+    Names that begin with the query rank ahead of those that only contain it,
+    then FTS5's bm25 score and shorter names break ties.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+
+    rows = session.execute(text(f"""
+        SELECT f.id, f.name, f.calories_per_100g, f.protein_per_100g, f.carbs_per_100g, f.fat_per_100g
+        FROM {FTS_TABLE}
+        JOIN food_item AS f ON f.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :expression
+        ORDER BY lower(f.name) LIKE :prefix DESC, bm25({FTS_TABLE}), length(f.name)
+        LIMIT :limit
+    """), {
+        'expression': expression,
+        'prefix': query.strip().lower().replace('%', '').replace('_', '') + '%',
+        'limit': max(1, min(int(limit), MAX_SEARCH_LIMIT))
+    })
+    return [dict(row._mapping) for row in rows]
+
+
+def read_food_rows(path):
+    """Yield (line number, row dict or None) for each CSV line, None when invalid"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in CSV_COLUMNS[:3] if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f'CSV is missing columns: {missing}')
+
+        for line_number, record in enumerate(reader, start=2):
+            try:
+                name = (record['name'] or '').strip()
+                if not name:
+                    raise ValueError
+                yield line_number, {
+                    'name': name[:100],
+                    'calories_per_100g': float(record['calories_per_100g']),
+                    'protein_per_100g': float(record['protein_per_100g']),
+                    'carbs_per_100g': float(record.get('carbs_per_100g') or 0),
+                    'fat_per_100g': float(record.get('fat_per_100g') or 0),
+                }
+            except (TypeError, ValueError):
+                yield line_number, None
+
+
+def import_foods_csv(session, table, path, chunk_size=5000):
+    """Insert foods from a CSV in chunks, one executemany and commit per chunk.
+
+    Returns (imported, skipped line numbers).
+    """
+    imported = 0
+    skipped = []
+    chunk = []
+    for line_number, row in read_food_rows(path):
+        if row is None:
+            skipped.append(line_number)
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            session.execute(table.insert(), chunk)
+            session.commit()
+            imported += len(chunk)
+            chunk = []
+
+    if chunk:
+        session.execute(table.insert(), chunk)
+        session.commit()
+        imported += len(chunk)
+    return imported, skipped
@@ -0,0 +1,39 @@
+"""
+Cached HTML fragments for rarely changing parts of a page
+
+A fragment is rendered once, stored as Markup under a key, and included in
+later pages without re-running its queries or its template. Keys should
+name the fragment, and `version` whatever it depends on: a fragment stored
+for another version is rendered again and replaced. Entries also expire
+after a TTL so a change made outside the app (a direct database edit,
+another process) shows up within that time. At most `max_entries`
+fragments are kept.
+"""
+
+from markupsafe import Markup
+from cache import TTLCache
+
+
+class FragmentCache:
+    def __init__(self, max_entries=256, ttl_seconds=300):
+        self._fragments = TTLCache(max_entries, ttl_seconds)
+
+    def get_or_render(self, key, render, version=None):
+        """Cached Markup for `key` at `version`, calling `render()` for the HTML on a miss"""
+        entry = self._fragments.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        # Concurrent misses just render it twice
+        html = Markup(render())
+        self._fragments.set(key, (version, html))
+        return html
+
+    def invalidate(self, key=None):
+        """Drop one fragment, or all of them"""
+        if key is None:
+            self._fragments.clear()
+        else:
+            self._fragments.pop(key)
+
+    def stats(self):
+        return self._fragments.stats()
@@ -0,0 +1,182 @@
+"""
+Request instrumentation: latency histograms, SQL counters and sampled profiles
+
+Per-route request latency, per-route SQL query counts and time (from
+SQLAlchemy engine events) and model inference time are kept in memory per
+process and rendered in the Prometheus text format by `Metrics.render`.
+Set PROFILE_SAMPLE_RATE to N to run cProfile on one in every N requests and
+dump the stats under PROFILE_DIR.
+"""
+
+import cProfile
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Upper bounds in seconds, Prometheus style (cumulative, +Inf last)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound label, cumulative count) pairs including +Inf"""
+        labels = [repr(bound) for bound in self.buckets] + ['+Inf']
+        return list(zip(labels, itertools.accumulate(self.counts)))
+
+
+class Metrics:
+    """Thread-safe in-process metrics registry"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}   # (endpoint, method) -> Histogram
+        self.request_status = {}    # (endpoint, method, status) -> count
+        self.sql_queries = {}       # endpoint -> count
+        self.sql_seconds = {}       # endpoint -> seconds
+        self.sql_per_request = {}   # endpoint -> Histogram of query counts
+        self.inference = {}         # kind -> Histogram
+
+    def observe_request(self, endpoint, method, status, seconds, sql_count, sql_seconds):
+        with self._lock:
+            self.request_latency.setdefault((endpoint, method), Histogram()).observe(seconds)
+            key = (endpoint, method, status)
+            self.request_status[key] = self.request_status.get(key, 0) + 1
+            self.sql_queries[endpoint] = self.sql_queries.get(endpoint, 0) + sql_count
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_seconds
+            self.sql_per_request.setdefault(
+                endpoint, Histogram(buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100))
+            ).observe(sql_count)
+
+    def observe_inference(self, kind, seconds):
+        with self._lock:
+            self.inference.setdefault(kind, Histogram()).observe(seconds)
+
+    @contextmanager
+    def time_inference(self, kind):
+        """Time a block of model inference, e.g. `with metrics.time_inference('single'):`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_inference(kind, time.perf_counter() - start)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines += histogram_lines('fittrack_request_duration_seconds', 'Request latency by route',
+                                     {f'endpoint="{e}",method="{m}"': h for (e, m), h in self.request_latency.items()})
+            lines.append('# HELP fittrack_requests_total Requests by route and status')
+            lines.append('# TYPE fittrack_requests_total counter')
+            for (endpoint, method, status), count in sorted(self.request_status.items()):
+                lines.append(f'fittrack_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+            lines.append('# HELP fittrack_sql_queries_total SQL statements executed by route')
+            lines.append('# TYPE fittrack_sql_queries_total counter')
+            for endpoint, count in sorted(self.sql_queries.items()):
+                lines.append(f'fittrack_sql_queries_total{{endpoint="{endpoint}"}} {count}')
+            lines.append('# HELP fittrack_sql_seconds_total Time spent in SQL by route')
+            lines.append('# TYPE fittrack_sql_seconds_total counter')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'fittrack_sql_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+            lines += histogram_lines('fittrack_sql_queries_per_request', 'SQL statements per request',
+                                     {f'endpoint="{e}"': h for e, h in self.sql_per_request.items()})
+            lines += histogram_lines('fittrack_inference_duration_seconds', 'Model inference time',
+                                     {f'kind="{k}"': h for k, h in self.inference.items()})
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(name, help_text, histograms):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, histogram in sorted(histograms.items()):
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+class SamplingProfiler:
+    """Profiles one in every `sample_rate` requests with cProfile"""
+
+    def __init__(self, sample_rate, output_dir):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._counter = itertools.count(1)
+        # cProfile only follows the thread that enabled it; one sample at a time
+        self._busy = threading.Lock()
+
+    def start(self):
+        if not self.sample_rate or next(self._counter) % self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler, endpoint):
+        try:
+            profiler.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            filename = f'{endpoint or "unknown"}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{time.perf_counter_ns()}.prof'
+            profiler.dump_stats(os.path.join(self.output_dir, filename))
+        finally:
+            self._busy.release()
+
+
+def init_instrumentation(app, engine, metrics):
+    """Hook request timing, SQL counting and sampled profiling into `app`"""
+    profiler = SamplingProfiler(app.config.get('PROFILE_SAMPLE_RATE', 0),
+                                app.config.get('PROFILE_DIR', 'profiles'))
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_start', time.perf_counter())
+        if has_request_context() and 'sql_count' in g:
+            g.sql_count += 1
+            g.sql_seconds += elapsed
+
+    @app.before_request
+    def start_request_timer():
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.profiler = profiler.start()
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is not None:
+            metrics.observe_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                    time.perf_counter() - start, g.sql_count, g.sql_seconds)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # Teardown runs even when the view raised, so the sample is always released
+        if g.get('profiler') is not None:
+            profiler.stop(g.pop('profiler'), request.endpoint)
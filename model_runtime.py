@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Pickle-free runtime for the weight prediction model
+
+Linear estimators are exported to a small JSON file holding the feature
+names, coefficients and intercept, and evaluated with a single NumPy dot
+product. Loading it avoids unpickling (and importing scikit-learn) at
+startup. Anything that is not a plain linear model keeps using the pickle.
+
+Models trained from the app's own data (training.py) are saved in the same
+format under models/versions/, and the version named in models/CURRENT is
+the one served. ModelRegistry watches that pointer so running workers swap
+to a newly promoted version without a restart.
+
+Export after replacing the pickle:
+    python model_runtime.py models/weight_prediction_model.pkl
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+
+MODEL_DIR = 'models'
+MODEL_PICKLE = os.path.join(MODEL_DIR, 'weight_prediction_model.pkl')
+MODEL_ARTIFACT = os.path.join(MODEL_DIR, 'weight_prediction_model.json')
+MODEL_VERSIONS_DIR = os.path.join(MODEL_DIR, 'versions')
+CURRENT_POINTER = os.path.join(MODEL_DIR, 'CURRENT')
+
+ARTIFACT_FORMAT = 'linear-v1'
+
+
+class LinearModel:
+    """Evaluates `X @ coef + intercept`, a drop-in for LinearRegression.predict"""
+
+    def __init__(self, coef, intercept, feature_names=None):
+        self.coef_ = np.asarray(coef, dtype=float)
+        self.intercept_ = float(intercept)
+        self.feature_names_in_ = list(feature_names) if feature_names is not None else None
+        self.n_features_in_ = self.coef_.shape[0]
+
+    def predict(self, X):
+        # DataFrames are reordered by name, like scikit-learn does
+        if self.feature_names_in_ is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names_in_]
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f'X has {X.shape[1]} features, but the model expects {self.n_features_in_}')
+        return X @ self.coef_ + self.intercept_
+
+
+def file_sha256(path):
+    """Hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_linear_estimator(model):
+    """True for single-output scikit-learn linear models (LinearRegression, Ridge, ...)"""
+    module = type(model).__module__
+    coef = getattr(model, 'coef_', None)
+    return (
+        module.startswith('sklearn.linear_model')
+        and coef is not None
+        and np.ndim(coef) == 1
+        and np.ndim(getattr(model, 'intercept_', None)) == 0
+    )
+
+
+def export_model(pickle_path=MODEL_PICKLE, artifact_path=MODEL_ARTIFACT):
+    """Write the JSON artifact for a pickled linear model.
+
+    Returns False (and writes nothing) if the estimator is not linear.
+    """
+    with open(pickle_path, 'rb') as f:
+        model = pickle.load(f)
+
+    if not is_linear_estimator(model):
+        print(f"{type(model).__name__} is not a linear model, keeping the pickle only.")
+        return False
+
+    feature_names = getattr(model, 'feature_names_in_', None)
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'estimator': type(model).__name__,
+        'source_sha256': file_sha256(pickle_path),
+        'features': [str(name) for name in feature_names] if feature_names is not None else None,
+        'coef': np.asarray(model.coef_, dtype=float).tolist(),
+        'intercept': float(model.intercept_),
+    }
+
+    write_atomic(artifact_path, json.dumps(artifact, indent=2))
+    return True
+
+
+def write_atomic(path, content):
+    # Write then rename so a running app never reads a half-written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def read_artifact(artifact_path):
+    """LinearModel from a JSON artifact, or None if the format is unknown"""
+    with open(artifact_path) as f:
+        artifact = json.load(f)
+
+    if artifact.get('format') != ARTIFACT_FORMAT:
+        print(f"Unsupported model artifact format: {artifact.get('format')}")
+        return None
+    return LinearModel(artifact['coef'], artifact['intercept'], artifact.get('features'))
+
+
+def load_linear_model(artifact_path=MODEL_ARTIFACT, pickle_path=MODEL_PICKLE):
+    """Load the JSON artifact, or return None if it is missing or stale.
+
+    The artifact is stale when the pickle next to it no longer matches the
+    hash recorded at export time.
+    """
+    if not os.path.exists(artifact_path):
+        return None
+
+    if os.path.exists(pickle_path):
+        with open(artifact_path) as f:
+            source_sha256 = json.load(f).get('source_sha256')
+        if file_sha256(pickle_path) != source_sha256:
+            print("Model artifact is out of date with the pickle, re-run model_runtime.py to refresh it.")
+            return None
+
+    return read_artifact(artifact_path)
+
+
+def load_pickled_model(pickle_path=MODEL_PICKLE):
+    with open(pickle_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_version(coef, intercept, features, metadata, versions_dir=MODEL_VERSIONS_DIR):
+    """Write a trained linear model as a new immutable version. Returns the version id."""
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'estimator': 'LinearModel',
+        'features': list(features),
+        'coef': np.asarray(coef, dtype=float).tolist(),
+        'intercept': float(intercept),
+    }
+    digest = hashlib.sha256(json.dumps(artifact, sort_keys=True).encode()).hexdigest()
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+    artifact.update(metadata, version=version)
+
+    os.makedirs(versions_dir, exist_ok=True)
+    write_atomic(os.path.join(versions_dir, f'{version}.json'), json.dumps(artifact, indent=2))
+    return version
+
+
+def list_versions(versions_dir=MODEL_VERSIONS_DIR):
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(name[:-len('.json')] for name in os.listdir(versions_dir) if name.endswith('.json'))
+
+
+def promote(version, pointer=CURRENT_POINTER, versions_dir=MODEL_VERSIONS_DIR):
+    """Make `version` the one served by every running app process"""
+    if version not in list_versions(versions_dir):
+        raise ValueError(f'Unknown model version: {version}')
+    write_atomic(pointer, version + '\n')
+
+
+def promoted_version(pointer=CURRENT_POINTER):
+    try:
+        with open(pointer) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+ActiveModel = namedtuple('ActiveModel', ['model', 'version'])
+
+
+class ModelRegistry:
+    """The model being served, swapped when models/CURRENT names a new version.
+
+    `current` is replaced as a whole (one attribute assignment), so a request
+    that read it keeps a consistent (model, version) pair even if a swap
+    happens mid-prediction, and readers never take a lock. `fallback` loads
+    the model used when no version has been promoted. A promoted version
+    that fails to load is logged once and not retried.
+    """
+
+    def __init__(self, fallback, features, pointer=CURRENT_POINTER, versions_dir=MODEL_VERSIONS_DIR,
+                 check_interval=5.0, logger=None):
+        self.fallback = fallback
+        self.logger = logger or logging.getLogger(__name__)
+        self.features = list(features)
+        self.pointer = pointer
+        self.versions_dir = versions_dir
+        self.check_interval = check_interval
+        self._reloading = threading.Lock()
+        self._next_check = 0.0
+        self._fallback_loaded = False
+        self._failed_version = None
+        self.current = ActiveModel(None, None)
+        self.reload()
+
+    def reload(self):
+        """Load the promoted version (or the fallback). Returns True if the model changed."""
+        version = promoted_version(self.pointer)
+        if version is not None and version not in (self.current.version, self._failed_version):
+            model = self.load_version(version)
+            if model is not None:
+                self.current = ActiveModel(model, version)
+                return True
+            self._failed_version = version
+
+        # Nothing promoted, or it failed to load before anything was served
+        if self.current.model is None and not self._fallback_loaded:
+            self._fallback_loaded = True
+            self.current = ActiveModel(*self.fallback())
+            return self.current.model is not None
+        return False
+
+    def load_version(self, version):
+        try:
+            model = read_artifact(os.path.join(self.versions_dir, f'{version}.json'))
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error('Could not load model version %s: %s', version, e)
+            return None
+        if model is not None and model.feature_names_in_ not in (None, self.features):
+            self.logger.error('Model version %s expects features %s, not %s',
+                              version, model.feature_names_in_, self.features)
+            return None
+        return model
+
+    def pin(self, model, version):
+        """Serve `model` from now on and stop following CURRENT, e.g. in benchmarks"""
+        self._next_check = float('inf')
+        self.current = ActiveModel(model, version)
+
+    def refresh(self):
+        """Cheap enough to call on every request: re-reads the pointer at most every check_interval"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        # One thread checks while the rest keep serving the current model
+        if not self._reloading.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = now + self.check_interval
+            return self.reload()
+        finally:
+            self._reloading.release()
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else MODEL_PICKLE
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + '.json'
+    if export_model(source, target):
+        print(f"Exported {source} -> {target}")
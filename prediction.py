@@ -0,0 +1,167 @@
+"""
+Weight prediction helpers shared by the API routes and offline scripts
+"""
+
+import warnings
+from functools import lru_cache
+import numpy as np
+from cache import TTLCache
+
+# Column order the model was trained with
+FEATURES = ['current_weight', 'daily_calories', 'weekly_workout_minutes', 'weeks_ahead']
+
+# Accepted input ranges, same limits as /api/predict-weight
+FEATURE_RANGES = {
+    'current_weight': (20, 300, 'Current weight must be between 20 and 300 kg'),
+    'daily_calories': (800, 5000, 'Daily calories must be between 800 and 5000'),
+    'weekly_workout_minutes': (0, 2000, 'Weekly workout minutes must be between 0 and 2000'),
+    'weeks_ahead': (1, 52, 'Weeks ahead must be between 1 and 52'),
+}
+
+# Realistic bounds for a predicted weight
+MIN_PREDICTED_WEIGHT = 30.0
+MAX_PREDICTED_WEIGHT = 300.0
+
+MAX_BATCH_SIZE = 10000
+
+# Distinct (model, inputs, horizon) trajectories kept in memory
+TRAJECTORY_CACHE_SIZE = 1024
+
+
+def parse_inputs(data, fields=FEATURES):
+    """Convert and range-check scalar inputs from a request body.
+
+    Returns the values as a tuple in `fields` order. Raises ValueError with a
+    user facing message, mirroring the checks in /api/predict-weight.
+    """
+    missing = [field for field in fields if field not in data or data[field] == '']
+    if missing:
+        raise ValueError(f'Missing required fields: {missing}')
+
+    values = []
+    for field in fields:
+        try:
+            value = int(data[field]) if field == 'weeks_ahead' else float(data[field])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Invalid input data: {str(e)}')
+        low, high, message = FEATURE_RANGES[field]
+        if not (low <= value <= high):
+            raise ValueError(message)
+        values.append(value)
+    return tuple(values)
+
+
+def scenarios_to_matrix(scenarios):
+    """Validate a list of input dicts and stack them into an (n, 4) float matrix.
+
+    Raises ValueError with a user facing message when any scenario is invalid.
+    """
+    if not isinstance(scenarios, list) or not scenarios:
+        raise ValueError('scenarios must be a non-empty list')
+    if len(scenarios) > MAX_BATCH_SIZE:
+        raise ValueError(f'At most {MAX_BATCH_SIZE} scenarios are allowed per request')
+    if not all(isinstance(s, dict) for s in scenarios):
+        raise ValueError('Each scenario must be an object')
+
+    columns = []
+    for field in FEATURES:
+        values = [s.get(field) for s in scenarios]
+        missing = [i for i, v in enumerate(values) if v is None or v == '']
+        if missing:
+            raise ValueError(f'Missing {field} in scenarios {missing[:10]}')
+        try:
+            column = np.asarray(values, dtype=float)
+            if column.ndim != 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {field}: all values must be numbers')
+        columns.append(column)
+
+    features = np.column_stack(columns)
+    # weeks_ahead is an integer count of weeks, like int() in the single endpoint
+    features[:, 3] = np.trunc(features[:, 3])
+
+    for i, field in enumerate(FEATURES):
+        low, high, message = FEATURE_RANGES[field]
+        column = features[:, i]
+        bad = np.flatnonzero(~((column >= low) & (column <= high)))
+        if bad.size:
+            raise ValueError(f'{message} (scenarios {bad[:10].tolist()})')
+
+    return features
+
+
+def predict_many(model, features):
+    """Run one vectorized prediction over an (n, 4) feature matrix.
+
+    Returns (predicted_weight, weight_change) arrays, clamped the same way as
+    the single prediction endpoint.
+    """
+    features = np.asarray(features, dtype=float)
+    with warnings.catch_warnings():
+        # The estimator was fitted on a DataFrame; a bare matrix in FEATURES
+        # order is equivalent and skips building one.
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        raw = np.asarray(model.predict(features), dtype=float).ravel()
+
+    predicted = np.clip(raw, MIN_PREDICTED_WEIGHT, MAX_PREDICTED_WEIGHT)
+    return predicted, predicted - features[:, 0]
+
+
+def calibrate(predicted, current_weights, adjustments):
+    """Add per-user corrections (kg) to global predictions, clamped like predict_many.
+
+    Returns (predicted_weight, weight_change) arrays.
+    """
+    calibrated = np.clip(np.asarray(predicted, dtype=float) + adjustments,
+                         MIN_PREDICTED_WEIGHT, MAX_PREDICTED_WEIGHT)
+    return calibrated, calibrated - current_weights
+
+
+def format_predictions(predicted, change):
+    """Turn prediction arrays into the JSON shape used by the API"""
+    return [
+        {'predicted_weight': w, 'weight_change': c}
+        for w, c in zip(np.round(predicted, 2).tolist(), np.round(change, 2).tolist())
+    ]
+
+
+@lru_cache(maxsize=TRAJECTORY_CACHE_SIZE)
+def predict_trajectory(model, current_weight, daily_calories, weekly_workout_minutes, horizon):
+    """Predicted weight for every week from 1 to `horizon` in one inference.
+
+    Results are memoized per model and input tuple, so returned values are
+    tuples: (weeks, predicted_weights, weight_changes).
+    """
+    weeks = np.arange(1, horizon + 1, dtype=float)
+    features = np.column_stack([
+        np.full_like(weeks, current_weight),
+        np.full_like(weeks, daily_calories),
+        np.full_like(weeks, weekly_workout_minutes),
+        weeks,
+    ])
+    predicted, change = predict_many(model, features)
+    return (
+        tuple(range(1, horizon + 1)),
+        tuple(np.round(predicted, 2).tolist()),
+        tuple(np.round(change, 2).tolist()),
+    )
+
+
+class PredictionCache(TTLCache):
+    """Thread-safe LRU cache with a per-entry TTL for prediction results.
+
+    Keys should include the loaded model's version so a new model never
+    serves results computed by the old one.
+    """
+
+
+def cache_key(model_version, current_weight, daily_calories, weekly_workout_minutes, weeks_ahead):
+    """Normalized key so 2000, 2000.0 and "2000" share one entry"""
+    return (
+        model_version,
+        round(float(current_weight), 4),
+        round(float(daily_calories), 4),
+        round(float(weekly_workout_minutes), 4),
+        int(weeks_ahead),
+    )
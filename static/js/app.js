@@ -112,6 +112,15 @@ const FitTrackML = {
         updateCounter();
     },
 
+    // Delay calls until the user stops typing
+    debounce: function(func, wait = 250) {
+        let timeout;
+        return function(...args) {
+            clearTimeout(timeout);
+            timeout = setTimeout(() => func.apply(this, args), wait);
+        };
+    },
+
     // Local Storage helpers
     storage: {
         set: function(key, value) {
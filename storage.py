@@ -0,0 +1,88 @@
+"""
+SQLite storage settings for production
+
+Applies WAL journaling, a relaxed but safe `synchronous` level, memory-mapped
+I/O and a busy timeout to every new connection, and sizes SQLAlchemy's pool
+for the threads of one worker process. Every setting can be overridden with
+an environment variable of the same name; set DB_POOL_SIZE to the number of
+request threads per worker.
+"""
+
+import os
+from sqlalchemy import event
+
+DEFAULTS = {
+    # WAL lets readers keep going while one writer commits
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    # NORMAL is durable across app crashes in WAL mode and skips an fsync per commit
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    # How long a connection waits for a lock before "database is locked"
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    # Page cache per connection, in KiB (negative values are KiB for SQLite)
+    'SQLITE_CACHE_SIZE_KB': 16 * 1024,
+    # Connections per worker process. Nothing reads the server's thread count,
+    # so set this to match it (e.g. gunicorn --threads); DB_MAX_OVERFLOW is headroom
+    'DB_POOL_SIZE': 4,
+    'DB_MAX_OVERFLOW': 2,
+    'DB_POOL_TIMEOUT': 10,
+}
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def load_storage_config(config):
+    """Fill storage settings into a Flask config from the environment or DEFAULTS"""
+    for name, default in DEFAULTS.items():
+        value = os.environ.get(name, config.get(name, default))
+        config[name] = value.upper() if isinstance(default, str) else int(value)
+
+    if config['SQLITE_JOURNAL_MODE'] not in JOURNAL_MODES:
+        raise ValueError(f"SQLITE_JOURNAL_MODE must be one of {sorted(JOURNAL_MODES)}")
+    if config['SQLITE_SYNCHRONOUS'] not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"SQLITE_SYNCHRONOUS must be one of {sorted(SYNCHRONOUS_LEVELS)}")
+
+    engine_options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        connect_args = dict(engine_options.get('connect_args', {}))
+        # pysqlite's own busy wait, used before the pragma is applied
+        connect_args.setdefault('timeout', config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+        # Pooled connections are handed between request threads
+        connect_args.setdefault('check_same_thread', False)
+        engine_options['connect_args'] = connect_args
+
+    if not is_memory_database(config['SQLALCHEMY_DATABASE_URI']):
+        engine_options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        engine_options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        engine_options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+
+def is_memory_database(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def install_sqlite_pragmas(engine, config):
+    """Run the configured PRAGMAs on every new connection of `engine`"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA cache_size = {-int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+    # Journal mode is stored in the file; in-memory databases can't use WAL
+    if not is_memory_database(str(engine.url)):
+        pragmas.insert(0, f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
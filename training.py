@@ -0,0 +1,230 @@
+"""
+Train the weight prediction model from the app's own logs
+
+Training examples pair a weigh-in with a later one 1 to 52 weeks on. The
+features are the earlier weight, the mean calories logged in between and
+the horizon in weeks, and the target is the later weight. Users are
+read in blocks of user ids (each an indexed range scan of ProgressLog and
+of NutritionLog joined to FoodItem). Each block's examples are built with
+NumPy and folded into the normal equations, so memory stays flat however
+many log rows there are.
+
+Every tenth user is held out to score the new model against the one being
+served before it is promoted.
+"""
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from calibration import DEFAULT_WORKOUT_MINUTES
+from prediction import FEATURES, FEATURE_RANGES
+
+USER_BLOCK_SIZE = 5000
+
+# Horizons a weigh-in is paired at, and how far the later weigh-in may miss them
+HORIZON_WEEKS = (1, 2, 4, 8, 12, 26, 52)
+HORIZON_TOLERANCE_DAYS = 3
+# Intervals with food logged on fewer days than this share are left out
+MIN_LOGGED_FRACTION = 0.5
+# user_id % VALIDATION_MODULUS == 0 goes to the validation set
+VALIDATION_MODULUS = 10
+
+FEATURE_UNITS = {
+    'current_weight': 'kg',
+    'daily_calories': 'kcal/day',
+    'weekly_workout_minutes': 'min/week',
+    'weeks_ahead': 'weeks',
+}
+
+USER_RANGE_SQL = text("SELECT MIN(id), MAX(id) FROM user")
+
+PROGRESS_BLOCK_SQL = text("""
+    SELECT user_id, date, weight FROM progress_log
+    WHERE user_id BETWEEN :low AND :high
+    ORDER BY user_id, date, id
+""")
+
+DAILY_CALORIES_BLOCK_SQL = text("""
+    SELECT n.user_id, n.date, SUM(f.calories_per_100g * n.quantity_grams / 100.0) AS calories
+    FROM nutrition_log AS n
+    JOIN food_item AS f ON f.id = n.food_id
+    WHERE n.user_id BETWEEN :low AND :high
+    GROUP BY n.user_id, n.date
+    ORDER BY n.user_id, n.date
+""")
+
+# Day numbers are below this, so user_id * DAY_SPAN + day sorts by (user, day)
+DAY_SPAN = 1 << 20
+
+
+def day_keys(frame):
+    days = (pd.to_datetime(frame['date']) - pd.Timestamp('2000-01-01')) // pd.Timedelta(days=1)
+    return frame['user_id'].to_numpy(dtype=np.int64) * DAY_SPAN + days.to_numpy(dtype=np.int64)
+
+
+def build_examples(progress, calories, workout_minutes=DEFAULT_WORKOUT_MINUTES):
+    """Feature matrix (FEATURES order), targets and user ids for one block.
+
+    `progress` and `calories` are DataFrames sorted by (user_id, date).
+    """
+    keys = day_keys(progress)
+    weights = progress['weight'].to_numpy(dtype=float)
+    users = progress['user_id'].to_numpy(dtype=np.int64)
+
+    calorie_keys = day_keys(calories)
+    # Prefix sums so any (start, end] interval is two lookups
+    calorie_sums = np.r_[0.0, np.cumsum(calories['calories'].to_numpy(dtype=float))]
+
+    blocks = []
+    for weeks in HORIZON_WEEKS:
+        # First weigh-in at least `weeks` weeks after each one
+        later = np.searchsorted(keys, keys + 7 * weeks - HORIZON_TOLERANCE_DAYS)
+        valid = later < len(keys)
+        later = np.minimum(later, len(keys) - 1)
+        gap = keys[later] - keys
+        valid &= (users[later] == users) & (np.abs(gap - 7 * weeks) <= HORIZON_TOLERANCE_DAYS)
+
+        start = np.searchsorted(calorie_keys, keys, side='right')
+        end = np.searchsorted(calorie_keys, keys[later], side='right')
+        logged_days = end - start
+        valid &= logged_days >= np.maximum(gap, 1) * MIN_LOGGED_FRACTION
+        index = np.flatnonzero(valid)
+        if not index.size:
+            continue
+
+        daily_calories = (calorie_sums[end[index]] - calorie_sums[start[index]]) / logged_days[index]
+        blocks.append((
+            np.column_stack([
+                weights[index],
+                daily_calories,
+                np.full(index.size, float(workout_minutes)),
+                np.full(index.size, float(weeks)),
+            ]),
+            weights[later[index]],
+            users[index],
+        ))
+
+    if not blocks:
+        return np.empty((0, len(FEATURES))), np.empty(0), np.empty(0, dtype=np.int64)
+    X, y, example_users = (np.concatenate(parts) for parts in zip(*blocks))
+
+    # Same input limits as the API, so the model is fitted where it is used
+    in_range = np.ones(len(y), dtype=bool)
+    for i, field in enumerate(FEATURES):
+        low, high, _ = FEATURE_RANGES[field]
+        in_range &= (X[:, i] >= low) & (X[:, i] <= high)
+    return X[in_range], y[in_range], example_users[in_range]
+
+
+class NormalEquations:
+    """Running XᵀX, Xᵀy and yᵀy for least squares with an intercept column"""
+
+    def __init__(self, n_features):
+        self.xtx = np.zeros((n_features + 1, n_features + 1))
+        self.xty = np.zeros(n_features + 1)
+        self.yty = 0.0
+
+    @property
+    def count(self):
+        return int(self.xtx[0, 0])
+
+    def add(self, X, y):
+        design = np.column_stack([np.ones(len(y)), X])
+        self.xtx += design.T @ design
+        self.xty += design.T @ y
+        self.yty += float(y @ y)
+
+    def constant_columns(self):
+        """Feature indexes with no variance in the data seen so far"""
+        n = self.xtx[0, 0]
+        variance = n * np.diag(self.xtx)[1:] - self.xtx[0, 1:] ** 2
+        return [i for i, v in enumerate(variance) if v <= 1e-9 * max(n * np.diag(self.xtx)[1 + i], 1.0)]
+
+    def solve(self, fixed=None):
+        """(coef, intercept) minimising squared error, with some coefficients held fixed.
+
+        `fixed` maps feature index -> coefficient. Fixed features are moved to
+        the target side, so they just shift what the others are fitted to.
+        """
+        fixed = fixed or {}
+        beta_fixed = np.zeros(len(self.xty))
+        for i, value in fixed.items():
+            beta_fixed[1 + i] = value
+        free = [0] + [1 + i for i in range(len(self.xty) - 1) if i not in fixed]
+
+        # Xᵀ(y - X·b_fixed) restricted to the free columns
+        rhs = (self.xty - self.xtx @ beta_fixed)[free]
+        beta = beta_fixed.copy()
+        beta[free] = np.linalg.lstsq(self.xtx[np.ix_(free, free)], rhs, rcond=None)[0]
+        return beta[1:], beta[0]
+
+    def rmse(self, coef, intercept):
+        """Root mean squared error of a linear model on the accumulated data"""
+        if not self.count:
+            return None
+        beta = np.r_[intercept, coef]
+        sse = self.yty - 2 * beta @ self.xty + beta @ self.xtx @ beta
+        return float(np.sqrt(max(sse, 0.0) / self.count))
+
+
+def train(connection, baseline=None, block_size=USER_BLOCK_SIZE):
+    """Fit a linear model on every user's logs.
+
+    `baseline` is the model currently served; features the logs cannot vary
+    (workout minutes are never logged) keep its coefficient, and it is scored
+    on the same validation users. Returns (coef, intercept, metadata).
+    """
+    train_set = NormalEquations(len(FEATURES))
+    validation_set = NormalEquations(len(FEATURES))
+    users = set()
+
+    low_id, high_id = connection.execute(USER_RANGE_SQL).one()
+    if low_id is not None:
+        for low in range(low_id, high_id + 1, block_size):
+            params = {'low': low, 'high': low + block_size - 1}
+            progress = pd.read_sql(PROGRESS_BLOCK_SQL, connection, params=params)
+            if progress.empty:
+                continue
+            calories = pd.read_sql(DAILY_CALORIES_BLOCK_SQL, connection, params=params)
+            X, y, example_users = build_examples(progress, calories)
+            held_out = example_users % VALIDATION_MODULUS == 0
+            train_set.add(X[~held_out], y[~held_out])
+            validation_set.add(X[held_out], y[held_out])
+            users.update(np.unique(example_users).tolist())
+
+    if train_set.count < len(FEATURES) + 1:
+        raise ValueError(f'Not enough training examples ({train_set.count}) in the logs')
+
+    baseline_coef = linear_coefficients(baseline)
+    fixed = {i: (baseline_coef[0][i] if baseline_coef else 0.0) for i in train_set.constant_columns()}
+    coef, intercept = train_set.solve(fixed)
+
+    metadata = {
+        'schema': {
+            'features': [
+                {'name': name, 'unit': FEATURE_UNITS[name], 'min': FEATURE_RANGES[name][0],
+                 'max': FEATURE_RANGES[name][1]}
+                for name in FEATURES
+            ],
+            'target': 'weight after weeks_ahead weeks (kg)',
+            'held_from_baseline': [FEATURES[i] for i in sorted(fixed)],
+        },
+        'training': {
+            'users': len(users),
+            'examples': train_set.count,
+            'validation_examples': validation_set.count,
+            'train_rmse': train_set.rmse(coef, intercept),
+            'validation_rmse': validation_set.rmse(coef, intercept),
+            'baseline_validation_rmse': validation_set.rmse(*baseline_coef) if baseline_coef else None,
+        },
+    }
+    return coef, intercept, metadata
+
+
+def linear_coefficients(model):
+    """(coef, intercept) of a linear model, or None for anything else"""
+    coef = getattr(model, 'coef_', None)
+    if coef is None or np.ndim(coef) != 1 or len(coef) != len(FEATURES):
+        return None
+    return np.asarray(coef, dtype=float), float(model.intercept_)
@@ -0,0 +1,141 @@
+"""
+Workout template catalogue cache and compact custom plans
+
+Every WorkoutTemplate is loaded once per process into an immutable
+snapshot with its weekly_plan already decoded. Triggers bump a version row
+in catalogue_version whenever workout_template changes, from this process
+or any other, and TemplateCatalogue reloads only when that version moves.
+The version check itself is rate limited like ModelRegistry's.
+
+A UserWorkout's custom_plan is stored as {"diff": {...}} holding only the
+days that differ from its template (null for a day the user dropped), and
+NULL when the user kept the template as is. Rows saved before that hold a
+full copy of the plan without the wrapper; a day's value is always a list,
+so the two can't be confused. `decode_plan` reads both, and
+`compact-workout-plans` rewrites the full copies.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy import select, text
+
+CATALOGUE = 'workout_template'
+
+VERSION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS catalogue_version (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )""",
+    f"INSERT OR IGNORE INTO catalogue_version (name, version) VALUES ('{CATALOGUE}', 1)",
+] + [
+    f"""CREATE TRIGGER IF NOT EXISTS workout_template_version_{event.lower()} AFTER {event} ON workout_template BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE name = '{CATALOGUE}';
+    END"""
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+VERSION_SQL = text("SELECT version FROM catalogue_version WHERE name = :name")
+
+TemplateEntry = namedtuple('TemplateEntry', ['id', 'name', 'goal', 'description', 'weekly_plan'])
+# templates in id order; by_id maps id -> TemplateEntry. Treat both as read-only.
+Catalogue = namedtuple('Catalogue', ['version', 'templates', 'by_id'])
+
+
+def create_catalogue_versioning(connection):
+    """Create the version table and triggers if missing. Returns True if they were created."""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'workout_template_version_insert'")
+    ).first()
+    for statement in VERSION_SCHEMA:
+        connection.execute(text(statement))
+    return not exists
+
+
+class TemplateCatalogue:
+    """Current Catalogue snapshot of the workout_template table"""
+
+    def __init__(self, table, check_interval=5.0):
+        self.table = table
+        self.check_interval = check_interval
+        self._current = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, session):
+        current = self._current
+        if current is not None and time.monotonic() < self._next_check:
+            return current
+        # Someone else is already checking; their snapshot is at most one interval old
+        if not self._lock.acquire(blocking=current is None):
+            return current
+        try:
+            current = self._current
+            if current is None or time.monotonic() >= self._next_check:
+                # Version first: if templates change in between, the next check reloads again
+                version = session.execute(VERSION_SQL, {'name': CATALOGUE}).scalar() or 0
+                if current is None or current.version != version:
+                    current = self._current = self.load(session, version)
+                self._next_check = time.monotonic() + self.check_interval
+            return current
+        finally:
+            self._lock.release()
+
+    def load(self, session, version):
+        columns = self.table.c
+        rows = session.execute(
+            select(columns.id, columns.name, columns.goal, columns.description, columns.weekly_plan)
+            .order_by(columns.id)
+        )
+        templates = tuple(TemplateEntry(*row) for row in rows)
+        return Catalogue(version, templates, {template.id: template for template in templates})
+
+    def invalidate(self):
+        """Check the version on the next get(), e.g. after changing templates in this process"""
+        self._next_check = 0.0
+
+
+def validate_plan(plan):
+    """Raise ValueError unless `plan` maps day names to lists of exercise names"""
+    if not isinstance(plan, dict):
+        raise ValueError('custom_plan must be an object of day: [exercises]')
+    for day, exercises in plan.items():
+        if not isinstance(exercises, list) or not all(isinstance(e, str) for e in exercises):
+            raise ValueError(f'custom_plan[{day!r}] must be a list of exercise names')
+
+
+def plan_diff(template_plan, plan):
+    """Days where `plan` differs from `template_plan`, or None when it doesn't"""
+    template_plan = template_plan or {}
+    diff = {day: exercises for day, exercises in plan.items() if template_plan.get(day) != exercises}
+    diff.update({day: None for day in template_plan if day not in plan})
+    return diff or None
+
+
+def apply_plan_diff(template_plan, diff):
+    """The full weekly plan for a template and a plan_diff"""
+    plan = dict(template_plan or {})
+    for day, exercises in (diff or {}).items():
+        if exercises is None:
+            plan.pop(day, None)
+        else:
+            plan[day] = exercises
+    return plan
+
+
+def is_encoded_plan(stored):
+    """Whether a stored custom_plan is a wrapped diff rather than a full copy"""
+    return isinstance(stored, dict) and stored.keys() == {'diff'} and isinstance(stored['diff'], dict)
+
+
+def encode_plan(template_plan, plan):
+    """custom_plan value to store for `plan`: the wrapped diff, or None when it matches the template"""
+    diff = plan_diff(template_plan, plan)
+    return {'diff': diff} if diff else None
+
+
+def decode_plan(template_plan, stored):
+    """The full weekly plan for a template and a stored custom_plan of either format"""
+    if stored is None or is_encoded_plan(stored):
+        return apply_plan_diff(template_plan, stored and stored['diff'])
+    return dict(stored)